@@ -27,6 +27,10 @@ class SemanticChunker:
         self.max_tokens = max_tokens
         self.overlap_tokens = overlap_tokens
         
+        # Token counts of spans seen during the current chunk_text() call;
+        # the splitter re-measures the same splits at each separator level
+        self._token_counts: Dict[str, int] = {}
+        
         try:
             self.encoding = tiktoken.get_encoding(encoding_name)
         except Exception as e:
@@ -38,11 +42,19 @@ class SemanticChunker:
         self.splitter = RecursiveCharacterTextSplitter(
             chunk_size=max_tokens * 4,  # Approximate character count
             chunk_overlap=overlap_tokens * 4,
-            length_function=lambda text: len(self.encoding.encode(text)),  # Use token count
+            length_function=self._count_tokens,  # Use token count
             separators=["\n\n", "\n", ". ", " ", ""],  # Hierarchical splitting
             keep_separator=True
         )
     
+    def _count_tokens(self, text: str) -> int:
+        """Return the token count of a span, memoized per chunk_text() call."""
+        count = self._token_counts.get(text)
+        if count is None:
+            count = len(self.encoding.encode_ordinary(text))
+            self._token_counts[text] = count
+        return count
+    
     def chunk_text(
         self,
         text: str,
@@ -62,14 +74,21 @@ class SemanticChunker:
             return []
         
         # Use LangChain's text splitter
-        text_chunks = self.splitter.split_text(text)
+        try:
+            text_chunks = self.splitter.split_text(text)
+        finally:
+            # Bound memory to one document
+            self._token_counts.clear()
+        
+        # Count tokens for all chunks in one call (tiktoken batches across threads)
+        token_counts = [
+            len(tokens) for tokens in self.encoding.encode_ordinary_batch(text_chunks)
+        ]
         
         chunks = []
         current_offset = 0
         
-        for index, chunk_text in enumerate(text_chunks):
-            token_count = len(self.encoding.encode(chunk_text))
-            
+        for index, (chunk_text, token_count) in enumerate(zip(text_chunks, token_counts)):
             chunk = {
                 'chunk_index': index,
                 'text': chunk_text,
@@ -1,4 +1,6 @@
 """Configuration management using Pydantic settings."""
+from functools import lru_cache
+from typing import Optional
 from pydantic_settings import BaseSettings
 
 
@@ -7,6 +9,9 @@ class Settings(BaseSettings):
     
     # Google API
     google_application_credentials: str = "/secrets/sa.json"
+    # Inline service account JSON (e.g. from a secret manager); used
+    # instead of the file above when set
+    google_application_credentials_json: Optional[str] = None
     root_folder_id: str
     
     # Database
@@ -15,6 +20,7 @@ class Settings(BaseSettings):
     # Embedding (local sentence-transformers only)
     embedding_model: str = "intfloat/multilingual-e5-large"
     embedding_dimension: int = 1024
+    embedding_batch_size: int = 128  # Texts per model forward pass
     
     # LLM Configuration
     llm_provider: str = "ollama"  # "ollama", "openai", or "gemini"
@@ -59,4 +65,15 @@ class Settings(BaseSettings):
         case_sensitive = False
 
 
-settings = Settings()
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """Load settings on first use (reads the environment and .env once)."""
+    return Settings()
+
+
+def __getattr__(name: str):
+    # Keeps `from app.config import settings` working while deferring
+    # construction until something actually asks for it
+    if name == "settings":
+        return get_settings()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
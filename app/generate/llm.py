@@ -1,6 +1,6 @@
 """LLM generation service using LangChain."""
 import logging
-from typing import List, Dict, Optional
+from typing import Iterator, List, Dict, Optional, Tuple
 from langchain_community.llms import Ollama
 from langchain_openai import ChatOpenAI
 from langchain_google_genai import ChatGoogleGenerativeAI
@@ -37,6 +37,10 @@ Käytä sitä dokumenttihakua ohjaavana "pseudo-dokumenttina".
 Vastaus:"""
 
 
+# generate() and batch_generate() return this plus the error instead of raising
+GENERATION_ERROR_PREFIX = "Virhe vastauksen generoinnissa: "
+
+
 class LLMService:
     """Service for LLM generation using LangChain."""
     
@@ -94,25 +98,93 @@ class LLMService:
             Generated text
         """
         try:
-            if system_message and self.provider in ["openai", "gemini"]:
-                # Use ChatPromptTemplate for chat models
-                chat_prompt = ChatPromptTemplate.from_messages([
-                    SystemMessagePromptTemplate.from_template(system_message),
-                    HumanMessagePromptTemplate.from_template("{prompt}")
-                ])
-                formatted_prompt = chat_prompt.format_messages(prompt=prompt)
-                response = self.llm.invoke(formatted_prompt)
-                # Extract content from AIMessage
-                return response.content.strip() if hasattr(response, 'content') else str(response).strip()
-            else:
-                # Simple invoke for Ollama or when no system message
-                full_prompt = f"{system_message}\n\n{prompt}" if system_message else prompt
-                response = self.llm.invoke(full_prompt)
-                return response.strip() if isinstance(response, str) else response.content.strip()
+            response = self.llm.invoke(self._llm_input(prompt, system_message))
+            return self._response_text(response)
                 
         except Exception as e:
             logger.error(f"Error generating with LangChain {self.provider}: {e}")
-            return f"Virhe vastauksen generoinnissa: {str(e)}"
+            return f"{GENERATION_ERROR_PREFIX}{str(e)}"
+    
+    def batch_generate(self, requests: List[Tuple[str, Optional[List[Dict]]]]) -> List[str]:
+        """
+        Generate several completions in one batched provider call.
+        
+        Args:
+            requests: (prompt, context_chunks) pairs; when context_chunks is
+                given the prompt is treated as a user query and answered from
+                that context, otherwise it is sent as is
+            
+        Returns:
+            Generated texts in request order
+        """
+        inputs = []
+        for prompt, context_chunks in requests:
+            system_message = None
+            if context_chunks is not None:
+                prompt, system_message = self.build_answer_prompt(prompt, context_chunks)
+            inputs.append(self._llm_input(prompt, system_message))
+        
+        # Per-item failures come back as exceptions instead of failing the batch
+        responses = self.llm.batch(inputs, return_exceptions=True)
+        
+        results = []
+        for response in responses:
+            if isinstance(response, Exception):
+                logger.error(f"Error generating with LangChain {self.provider}: {response}")
+                results.append(f"{GENERATION_ERROR_PREFIX}{str(response)}")
+            else:
+                results.append(self._response_text(response))
+        return results
+    
+    def _llm_input(self, prompt: str, system_message: Optional[str] = None):
+        """Build the provider input for a prompt and optional system message."""
+        if system_message and self.provider in ["openai", "gemini"]:
+            # Use ChatPromptTemplate for chat models
+            chat_prompt = ChatPromptTemplate.from_messages([
+                SystemMessagePromptTemplate.from_template(system_message),
+                HumanMessagePromptTemplate.from_template("{prompt}")
+            ])
+            return chat_prompt.format_messages(prompt=prompt)
+        
+        # Plain prompt for Ollama or when no system message
+        return f"{system_message}\n\n{prompt}" if system_message else prompt
+    
+    @staticmethod
+    def _response_text(response) -> str:
+        """Extract text from a plain string or AIMessage response."""
+        return response.strip() if isinstance(response, str) else response.content.strip()
+    
+    def stream(self, prompt: str, system_message: Optional[str] = None) -> Iterator[str]:
+        """
+        Stream generated text fragments as the provider produces them.
+        
+        Args:
+            prompt: The prompt to generate from
+            system_message: Optional system message
+            
+        Yields:
+            Text fragments
+        """
+        for chunk in self.llm.stream(self._llm_input(prompt, system_message)):
+            # Chat models yield message chunks, Ollama yields plain strings
+            text = chunk if isinstance(chunk, str) else chunk.content
+            if text:
+                yield text
+    
+    def build_answer_prompt(self, query: str, context_chunks: List[Dict]) -> Tuple[str, Optional[str]]:
+        """Build the (prompt, system_message) pair for answering a query."""
+        # Format context
+        context_text = self._format_context(context_chunks)
+        
+        # For OpenAI-style APIs and Gemini, use system message properly
+        if self.provider in ["openai", "gemini"]:
+            system_message = SYSTEM_PROMPT.format(context=context_text)
+            return f"KYSYMYS: {query}\n\nVASTAUS:", system_message
+        
+        # For Ollama, combine everything into one prompt
+        prompt = SYSTEM_PROMPT.format(context=context_text)
+        prompt += f"\n\nKYSYMYS: {query}\n\nVASTAUS:"
+        return prompt, None
     
     def generate_answer(
         self,
@@ -129,19 +201,8 @@ class LLMService:
         Returns:
             Dictionary with answer and sources
         """
-        # Format context
-        context_text = self._format_context(context_chunks)
-        
-        # For OpenAI-style APIs and Gemini, use system message properly
-        if self.provider in ["openai", "gemini"]:
-            system_message = SYSTEM_PROMPT.format(context=context_text)
-            user_prompt = f"KYSYMYS: {query}\n\nVASTAUS:"
-            answer_text = self.generate(user_prompt, system_message=system_message)
-        else:
-            # For Ollama, combine everything into one prompt
-            prompt = SYSTEM_PROMPT.format(context=context_text)
-            prompt += f"\n\nKYSYMYS: {query}\n\nVASTAUS:"
-            answer_text = self.generate(prompt)
+        prompt, system_message = self.build_answer_prompt(query, context_chunks)
+        answer_text = self.generate(prompt, system_message=system_message)
         
         # Extract sources
         sources = self._extract_sources(context_chunks)
@@ -151,6 +212,24 @@ class LLMService:
             "sources": sources
         }
     
+    def stream_answer(
+        self,
+        query: str,
+        context_chunks: List[Dict]
+    ) -> Tuple[Iterator[str], List[Dict]]:
+        """
+        Stream an answer with source citations.
+        
+        Args:
+            query: User query
+            context_chunks: List of relevant chunks with metadata
+            
+        Returns:
+            Tuple of (answer text fragments iterator, sources)
+        """
+        prompt, system_message = self.build_answer_prompt(query, context_chunks)
+        return self.stream(prompt, system_message=system_message), self._extract_sources(context_chunks)
+    
     def generate_multi_queries(self, query: str) -> List[str]:
         """
         Generate multiple query variations.
@@ -163,7 +242,11 @@ class LLMService:
         """
         prompt = MULTI_QUERY_PROMPT.format(user_query=query)
         response = self.generate(prompt)
-        
+        return self.parse_multi_queries(query, response)
+    
+    @staticmethod
+    def parse_multi_queries(query: str, response: str) -> List[str]:
+        """Turn a MULTI_QUERY_PROMPT response into query variations."""
         # Parse queries
         queries = [q.strip() for q in response.split('\n') if q.strip()]
         # Add original query
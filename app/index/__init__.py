@@ -1,4 +1,4 @@
 """Indexing module."""
-from .pgvector import EmbeddingService, PgVectorIndexer
+from .pgvector import EmbeddingService, PgVectorIndexer, ChunkBuffer, FlushResult
 
-__all__ = ['EmbeddingService', 'PgVectorIndexer']
+__all__ = ['EmbeddingService', 'PgVectorIndexer', 'ChunkBuffer', 'FlushResult']
@@ -1,7 +1,10 @@
 """Embedding generation and pgvector indexing using LangChain."""
 import logging
-from typing import List, Dict
+import uuid
+from typing import List, Dict, NamedTuple, Tuple
 import psycopg
+from pgvector.psycopg import register_vector
+from psycopg_pool import ConnectionPool
 from langchain_huggingface import HuggingFaceEmbeddings
 from app.config import settings
 
@@ -19,7 +22,10 @@ class EmbeddingService:
         self.model_instance = HuggingFaceEmbeddings(
             model_name=self.model,
             model_kwargs={'device': 'cpu'},  # Will auto-detect GPU
-            encode_kwargs={'normalize_embeddings': False, 'batch_size': 32}
+            encode_kwargs={
+                'normalize_embeddings': False,
+                'batch_size': settings.embedding_batch_size
+            }
         )
         
         # Get dimension from config (LangChain doesn't expose it directly)
@@ -45,87 +51,50 @@ class EmbeddingService:
             raise
 
 
+def _configure_connection(conn: psycopg.Connection):
+    """Register the pgvector types on each new pooled connection."""
+    register_vector(conn)
+    conn.commit()
+
+
 class PgVectorIndexer:
     """Handles indexing to PostgreSQL with pgvector and BM25."""
     
-    def __init__(self, db_url: str):
+    def __init__(self, db_url: str, pool_size: int = 4):
         self.db_url = db_url
         self.embedding_service = EmbeddingService()
+        
+        # Reuse connections across documents instead of paying a connect
+        # handshake for every upsert and flush
+        self.pool = ConnectionPool(
+            db_url,
+            min_size=1,
+            max_size=pool_size,
+            configure=_configure_connection,
+            open=True
+        )
     
-    def index_chunks(
-        self,
-        document_id: str,
-        chunks: List[Dict]
-    ) -> int:
+    def close(self):
+        """Close the connection pool."""
+        self.pool.close()
+    
+    def get_content_hashes(self, file_ids: List[str]) -> Dict[str, str]:
         """
-        Index document chunks with embeddings and BM25.
+        Look up stored content hashes for many files in one query.
         
         Args:
-            document_id: UUID of the parent document
-            chunks: List of chunk dictionaries
+            file_ids: Google Drive file IDs
             
         Returns:
-            Number of chunks indexed
+            Mapping of file_id to content hash for files already indexed
         """
-        if not chunks:
-            return 0
-        
-        try:
-            # Generate embeddings for all chunks
-            texts = [chunk['text'] for chunk in chunks]
-            embeddings = self.embedding_service.embed_texts(texts)
-            
-            # Connect to database
-            with psycopg.connect(self.db_url) as conn:
-                with conn.cursor() as cur:
-                    indexed_count = 0
-                    
-                    for chunk, embedding in zip(chunks, embeddings):
-                        # Insert chunk
-                        cur.execute("""
-                            INSERT INTO chunks 
-                            (document_id, chunk_index, text, start_offset, end_offset, 
-                             page_or_heading, token_count)
-                            VALUES (%s, %s, %s, %s, %s, %s, %s)
-                            RETURNING id
-                        """, (
-                            document_id,
-                            chunk['chunk_index'],
-                            chunk['text'],
-                            chunk.get('start_offset', 0),
-                            chunk.get('end_offset', 0),
-                            chunk.get('page_or_heading', ''),
-                            chunk.get('token_count', 0)
-                        ))
-                        
-                        chunk_id = cur.fetchone()[0]
-                        
-                        # Insert embedding
-                        cur.execute("""
-                            INSERT INTO embeddings (chunk_id, embedding, model, dim)
-                            VALUES (%s, %s, %s, %s)
-                        """, (
-                            chunk_id,
-                            embedding,
-                            self.embedding_service.model,
-                            self.embedding_service.dimension
-                        ))
-                        
-                        # Insert BM25 full-text search
-                        cur.execute("""
-                            INSERT INTO documents_fts (chunk_id, tsv)
-                            VALUES (%s, to_tsvector('english', %s))
-                        """, (chunk_id, chunk['text']))
-                        
-                        indexed_count += 1
-                    
-                    conn.commit()
-                    logger.info(f"Indexed {indexed_count} chunks for document {document_id}")
-                    return indexed_count
-                    
-        except Exception as e:
-            logger.error(f"Error indexing chunks: {e}")
-            raise
+        with self.pool.connection() as conn:
+            rows = conn.execute(
+                "SELECT file_id, content_sha256 FROM documents WHERE file_id = ANY(%s)",
+                (file_ids,),
+                prepare=True
+            ).fetchall()
+        return {file_id: content_hash for file_id, content_hash in rows}
     
     def upsert_document(self, file_metadata: Dict) -> str:
         """
@@ -138,60 +107,221 @@ class PgVectorIndexer:
             Document UUID
         """
         try:
-            with psycopg.connect(self.db_url) as conn:
+            with self.pool.connection() as conn:
                 with conn.cursor() as cur:
-                    # Check if document exists
-                    cur.execute(
-                        "SELECT id FROM documents WHERE file_id = %s",
-                        (file_metadata['file_id'],)
-                    )
-                    result = cur.fetchone()
-                    
-                    if result:
-                        # Update existing document
-                        doc_id = result[0]
-                        cur.execute("""
-                            UPDATE documents 
-                            SET name = %s, path = %s, mime_type = %s, 
-                                revision = %s, modified_time = %s, 
-                                drive_link = %s, content_sha256 = %s
-                            WHERE id = %s
-                        """, (
-                            file_metadata['name'],
-                            file_metadata.get('path', ''),
-                            file_metadata['mime_type'],
-                            file_metadata.get('revision', ''),
-                            file_metadata.get('modified_time'),
-                            file_metadata['drive_link'],
-                            file_metadata.get('content_sha256', ''),
-                            doc_id
-                        ))
-                        
-                        # Delete old chunks (cascade will handle embeddings and fts)
-                        cur.execute("DELETE FROM chunks WHERE document_id = %s", (doc_id,))
-                    else:
-                        # Insert new document
-                        cur.execute("""
-                            INSERT INTO documents 
-                            (file_id, name, path, mime_type, revision, modified_time, 
-                             drive_link, content_sha256)
-                            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                            RETURNING id
-                        """, (
-                            file_metadata['file_id'],
-                            file_metadata['name'],
-                            file_metadata.get('path', ''),
-                            file_metadata['mime_type'],
-                            file_metadata.get('revision', ''),
-                            file_metadata.get('modified_time'),
-                            file_metadata['drive_link'],
-                            file_metadata.get('content_sha256', '')
-                        ))
-                        doc_id = cur.fetchone()[0]
-                    
+                    doc_id = _upsert_document_row(cur, file_metadata)
                     conn.commit()
                     return str(doc_id)
                     
         except Exception as e:
             logger.error(f"Error upserting document: {e}")
             raise
+
+
+def _upsert_document_row(cur: psycopg.Cursor, file_metadata: Dict) -> uuid.UUID:
+    """
+    Insert or update a document row and drop its old chunks, in the
+    caller's transaction.
+    
+    Returns:
+        Document UUID
+    """
+    # Check if document exists
+    cur.execute(
+        "SELECT id FROM documents WHERE file_id = %s",
+        (file_metadata['file_id'],)
+    )
+    result = cur.fetchone()
+    
+    if result:
+        # Update existing document
+        doc_id = result[0]
+        cur.execute("""
+            UPDATE documents 
+            SET name = %s, path = %s, mime_type = %s, 
+                revision = %s, modified_time = %s, 
+                drive_link = %s, content_sha256 = %s
+            WHERE id = %s
+        """, (
+            file_metadata['name'],
+            file_metadata.get('path', ''),
+            file_metadata['mime_type'],
+            file_metadata.get('revision', ''),
+            file_metadata.get('modified_time'),
+            file_metadata['drive_link'],
+            file_metadata.get('content_sha256', ''),
+            doc_id
+        ))
+        
+        # Delete old chunks (cascade will handle embeddings and fts)
+        cur.execute("DELETE FROM chunks WHERE document_id = %s", (doc_id,))
+        return doc_id
+    
+    # Insert new document
+    cur.execute("""
+        INSERT INTO documents 
+        (file_id, name, path, mime_type, revision, modified_time, 
+         drive_link, content_sha256)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+        RETURNING id
+    """, (
+        file_metadata['file_id'],
+        file_metadata['name'],
+        file_metadata.get('path', ''),
+        file_metadata['mime_type'],
+        file_metadata.get('revision', ''),
+        file_metadata.get('modified_time'),
+        file_metadata['drive_link'],
+        file_metadata.get('content_sha256', '')
+    ))
+    return cur.fetchone()[0]
+
+
+class FlushResult(NamedTuple):
+    """Outcome of a ChunkBuffer flush, per document."""
+    # (file_metadata, chunks written) for documents now fully indexed
+    written: List[Tuple[Dict, int]]
+    # (file_metadata, error) for documents left as they were before
+    failed: List[Tuple[Dict, Exception]]
+
+
+class ChunkBuffer:
+    """
+    Buffers documents and their chunks and writes them with binary COPY.
+    
+    Per-chunk INSERTs cost three round trips each, which dominates ingest
+    time for corpora of many small files. The buffer collects documents
+    and flushes them in one transaction once batch_rows chunks are queued.
+    Embeddings are generated at flush time too, so the model sees full
+    batches rather than one small document at a time.
+    
+    Each document's upsert (new content hash, old chunks deleted) happens
+    in the same transaction as its new chunks, so a failed flush leaves
+    the documents exactly as they were and the next run retries them.
+    """
+    
+    def __init__(self, indexer: PgVectorIndexer, batch_rows: int = 1000):
+        self.indexer = indexer
+        self.batch_rows = batch_rows
+        # file_id -> (file_metadata, chunks)
+        self._documents: Dict[str, Tuple[Dict, List[Dict]]] = {}
+        self._row_count = 0
+    
+    def __len__(self) -> int:
+        return self._row_count
+    
+    def add(self, file_metadata: Dict, chunks: List[Dict]) -> FlushResult:
+        """
+        Queue a document and its chunks for the next flush.
+        
+        Args:
+            file_metadata: Document metadata as taken by upsert_document()
+            chunks: List of chunk dictionaries
+            
+        Returns:
+            Outcome of the flush this call triggered (empty if none)
+        """
+        # A newer copy of a file replaces the one still buffered
+        previous = self._documents.pop(file_metadata['file_id'], None)
+        if previous is not None:
+            self._row_count -= len(previous[1])
+        
+        self._documents[file_metadata['file_id']] = (file_metadata, chunks)
+        self._row_count += len(chunks)
+        
+        if self._row_count >= self.batch_rows:
+            return self.flush()
+        return FlushResult([], [])
+    
+    def flush(self) -> FlushResult:
+        """
+        Upsert all buffered documents and write their embedded chunks.
+        
+        Returns:
+            Which documents were written and which failed
+        """
+        documents = list(self._documents.values())
+        self._documents = {}
+        self._row_count = 0
+        if not documents:
+            return FlushResult([], [])
+        
+        try:
+            self._write(documents)
+            return FlushResult([(file_metadata, len(chunks)) for file_metadata, chunks in documents], [])
+        except Exception as e:
+            logger.error(f"Error flushing {len(documents)} buffered documents: {e}")
+            if len(documents) == 1:
+                return FlushResult([], [(documents[0][0], e)])
+        
+        # Retry one document at a time so a single bad document (e.g. one
+        # the embedding model rejects) does not sink the rest of the batch
+        result = FlushResult([], [])
+        for file_metadata, chunks in documents:
+            try:
+                self._write([(file_metadata, chunks)])
+                result.written.append((file_metadata, len(chunks)))
+            except Exception as e:
+                logger.error(f"Error writing document {file_metadata.get('name', 'unknown')}: {e}")
+                result.failed.append((file_metadata, e))
+        return result
+    
+    def _write(self, documents: List[Tuple[Dict, List[Dict]]]):
+        """Embed and write documents with their chunks in one transaction."""
+        # One embedding call across all buffered documents
+        texts = [chunk['text'] for _, chunks in documents for chunk in chunks]
+        embeddings = self.indexer.embedding_service.embed_texts(texts) if texts else []
+        
+        model = self.indexer.embedding_service.model
+        dimension = self.indexer.embedding_service.dimension
+        
+        # The pool rolls the transaction back if anything below raises
+        with self.indexer.pool.connection() as conn:
+            with conn.cursor() as cur:
+                rows = []
+                for file_metadata, chunks in documents:
+                    document_id = _upsert_document_row(cur, file_metadata)
+                    rows.extend((document_id, chunk) for chunk in chunks)
+                
+                # Generate ids client-side so COPY can fill all three tables
+                chunk_ids = [uuid.uuid4() for _ in rows]
+                
+                if rows:
+                    with cur.copy("""
+                        COPY chunks
+                        (id, document_id, chunk_index, text, start_offset, end_offset,
+                         page_or_heading, token_count)
+                        FROM STDIN WITH (FORMAT BINARY)
+                    """) as copy:
+                        copy.set_types(['uuid', 'uuid', 'int4', 'text', 'int4', 'int4', 'text', 'int4'])
+                        for chunk_id, (document_id, chunk) in zip(chunk_ids, rows):
+                            copy.write_row((
+                                chunk_id,
+                                document_id,
+                                chunk['chunk_index'],
+                                chunk['text'],
+                                chunk.get('start_offset', 0),
+                                chunk.get('end_offset', 0),
+                                chunk.get('page_or_heading', ''),
+                                chunk.get('token_count', 0)
+                            ))
+                    
+                    with cur.copy("""
+                        COPY embeddings (chunk_id, embedding, model, dim)
+                        FROM STDIN WITH (FORMAT BINARY)
+                    """) as copy:
+                        copy.set_types(['uuid', 'vector', 'text', 'int4'])
+                        for chunk_id, embedding in zip(chunk_ids, embeddings):
+                            copy.write_row((chunk_id, embedding, model, dimension))
+                    
+                    # tsvectors are computed server-side, so COPY can't fill them
+                    cur.execute("""
+                        INSERT INTO documents_fts (chunk_id, tsv)
+                        SELECT id, to_tsvector('english', text)
+                        FROM chunks
+                        WHERE id = ANY(%s)
+                    """, (chunk_ids,))
+            
+            conn.commit()
+        
+        logger.info(f"Flushed {len(rows)} chunks for {len(documents)} documents")
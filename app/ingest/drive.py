@@ -1,9 +1,10 @@
 """Google Drive API integration for file discovery and download."""
+import io
+import json
 import os
-import hashlib
-from typing import List, Dict, Optional
-from google.oauth2 import service_account
-from googleapiclient.discovery import build
+from functools import lru_cache
+from typing import BinaryIO, List, Dict, Optional
+from blake3 import blake3
 from googleapiclient.errors import HttpError
 import logging
 
@@ -11,16 +12,89 @@ logger = logging.getLogger(__name__)
 
 SCOPES = ['https://www.googleapis.com/auth/drive.readonly']
 
+# Bytes fetched per request by download_file_stream
+DOWNLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+
+# Marks the algorithm of stored content hashes. Rows written before the
+# switch from SHA-256 hold bare hex digests, so neither the Celery task nor
+# ingest_from_csv.py finds a match and each such document is re-indexed once.
+CONTENT_HASH_PREFIX = 'blake3:'
+
+
+@lru_cache(maxsize=4)
+def _parse_sa(path: str, mtime_ns: int) -> Dict:
+    with open(path, 'rb') as f:
+        return json.load(f)
+
+
+def _load_sa(path: str) -> Dict:
+    """
+    Parsed service account JSON, read once per process and file version.
+    
+    Keyed on the file's mtime so a replaced key file is picked up.
+    """
+    return _parse_sa(path, os.stat(path).st_mtime_ns)
+
+
+@lru_cache(maxsize=4)
+def _parse_sa_json(text: str) -> Dict:
+    return json.loads(text)
+
+
+@lru_cache(maxsize=1)
+def _discovery_document() -> Optional[str]:
+    """Drive v3 discovery document bundled with the client library, read once per process."""
+    from googleapiclient.discovery_cache import get_static_doc
+    return get_static_doc('drive', 'v3')
+
 
 class DriveClient:
     """Client for interacting with Google Drive API."""
     
-    def __init__(self, credentials_path: str):
-        """Initialize Drive client with service account credentials."""
-        self.credentials = service_account.Credentials.from_service_account_file(
-            credentials_path, scopes=SCOPES
+    def __init__(self, credentials_path: Optional[str] = None, *, info: Optional[Dict] = None):
+        """
+        Initialize Drive client with service account credentials.
+        
+        Args:
+            credentials_path: Path to the service account JSON file
+            info: Already parsed service account JSON; used instead of
+                reading credentials_path
+        """
+        # google-auth and the discovery client are heavy imports; load them
+        # only when a client is actually built
+        from google.oauth2 import service_account
+        from googleapiclient.discovery import build, build_from_document
+        
+        if info is None:
+            if credentials_path is None:
+                raise ValueError("DriveClient needs credentials_path or info")
+            info = _load_sa(credentials_path)
+        
+        self.credentials = service_account.Credentials.from_service_account_info(
+            info, scopes=SCOPES
         )
-        self.service = build('drive', 'v3', credentials=self.credentials)
+        # Use the discovery document bundled with the client library instead
+        # of fetching it; every client in the process shares one read of it
+        document = _discovery_document()
+        if document is not None:
+            self.service = build_from_document(document, credentials=self.credentials)
+        else:
+            self.service = build(
+                'drive', 'v3',
+                credentials=self.credentials,
+                static_discovery=True,
+                cache_discovery=False
+            )
+    
+    @classmethod
+    def from_settings(cls, settings) -> "DriveClient":
+        """
+        Create a client from application settings, preferring inline JSON
+        credentials over the credentials file when both are configured.
+        """
+        if settings.google_application_credentials_json:
+            return cls(info=_parse_sa_json(settings.google_application_credentials_json))
+        return cls(settings.google_application_credentials)
     
     def list_files_recursive(
         self, 
@@ -159,7 +233,41 @@ class DriveClient:
             logger.error(f"Error downloading file {file_id}: {error}")
             raise
     
+    def download_file_stream(self, file_id: str, buffer: Optional[BinaryIO] = None) -> BinaryIO:
+        """
+        Download a file's content into an in-memory buffer or a given file.
+        
+        Chunks are written straight into the buffer, so no second full-size
+        bytes copy is built; callers can hand the buffer to the parser and
+        close it afterwards.
+        
+        Args:
+            file_id: Google Drive file ID
+            buffer: Writable binary file to download into (default: a new BytesIO)
+            
+        Returns:
+            Buffer positioned at the start of the file content
+        """
+        from googleapiclient.http import MediaIoBaseDownload
+        
+        try:
+            request = self.service.files().get_media(fileId=file_id)
+            if buffer is None:
+                buffer = io.BytesIO()
+            downloader = MediaIoBaseDownload(buffer, request, chunksize=DOWNLOAD_CHUNK_SIZE)
+            
+            done = False
+            while not done:
+                _, done = downloader.next_chunk()
+            
+            buffer.seek(0)
+            return buffer
+            
+        except HttpError as error:
+            logger.error(f"Error downloading file {file_id}: {error}")
+            raise
+    
     @staticmethod
     def compute_content_hash(content: str) -> str:
-        """Compute SHA256 hash of content for deduplication."""
-        return hashlib.sha256(content.encode('utf-8')).hexdigest()
+        """Compute BLAKE3 hash of content for deduplication, as 'blake3:<hex>'."""
+        return CONTENT_HASH_PREFIX + blake3(content.encode('utf-8', 'replace')).hexdigest()
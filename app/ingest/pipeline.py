@@ -0,0 +1,249 @@
+"""Ingest pipeline stages shared by the Celery task and the CSV ingest script.
+
+Each file goes through three independent stages so they can overlap:
+
+1. fetch_content    - download/export from Drive (network-bound, thread pool)
+2. prepare_document - parse, clean, hash and chunk (CPU-bound, process pool;
+                      see HANDLERS for per-mime routing)
+3. write            - upsert document and index chunks (single DB writer)
+
+The write stage stays with the callers since they track progress differently.
+"""
+import io
+import itertools
+import logging
+import os
+import tempfile
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import BinaryIO, Callable, Dict, Iterable, Iterator, NamedTuple, Optional, Tuple, Union
+from app.config import settings
+from app.ingest.drive import DriveClient
+from app.parse.pdf import parse_pdf
+from app.parse.docs import parse_google_doc
+from app.chunking.semantic import SemanticChunker
+
+logger = logging.getLogger(__name__)
+
+PDF_MIME_TYPE = 'application/pdf'
+GOOGLE_DOC_MIME_TYPE = 'application/vnd.google-apps.document'
+
+# Default width of the download thread pool (Drive calls are network-bound)
+DOWNLOAD_WORKERS = 16
+
+# Default number of files downloaded ahead of the consumer; bounds the
+# memory held by fetched-but-unprocessed content
+PREFETCH_DEPTH = 2 * DOWNLOAD_WORKERS
+
+# str.translate table dropping NUL and control codes except tab and newline
+_CTRL_TABLE = {c: None for c in range(32) if c not in (9, 10)}
+
+_thread_state = threading.local()
+_chunker: Optional[SemanticChunker] = None
+
+
+def get_drive_client() -> DriveClient:
+    """Return a DriveClient for the current thread (httplib2 is not thread-safe)."""
+    drive_client = getattr(_thread_state, 'drive_client', None)
+    if drive_client is None:
+        drive_client = DriveClient.from_settings(settings)
+        _thread_state.drive_client = drive_client
+    return drive_client
+
+
+def get_chunker() -> SemanticChunker:
+    """Return the chunker for the current process, creating it on first use."""
+    global _chunker
+    if _chunker is None:
+        _chunker = SemanticChunker(
+            max_tokens=settings.max_chunk_tokens,
+            overlap_tokens=settings.chunk_overlap
+        )
+    return _chunker
+
+
+def init_worker():
+    """
+    Process pool initializer: build the chunker (tiktoken BPE tables and
+    splitter) when the worker starts, not while it handles its first file.
+    """
+    get_chunker()
+
+
+def clean_text_for_postgres(text: str) -> str:
+    """Remove NUL bytes and other problematic characters for PostgreSQL."""
+    if not text:
+        return text
+
+    return text.translate(_CTRL_TABLE).strip()
+
+
+def _parse_pdf_buffer(content: Union[io.BytesIO, Path]) -> str:
+    try:
+        return parse_pdf(content)
+    finally:
+        # Release the downloaded bytes (or spooled file) before chunking and embedding
+        if isinstance(content, Path):
+            content.unlink(missing_ok=True)
+        else:
+            content.close()
+
+
+class MimeHandler(NamedTuple):
+    """How one supported mime type is fetched and parsed."""
+    source_type: str
+    fetch: Callable[[DriveClient, str], Union[io.BytesIO, str]]
+    parse: Callable[[Union[io.BytesIO, str, Path]], str]
+    # Parsing is CPU-heavy and belongs on a process pool
+    cpu_bound: bool
+    # Downloads into a given file, so spool_content can hand a worker
+    # process a path instead of a pickled copy of the bytes
+    fetch_into: Optional[Callable[[DriveClient, str, BinaryIO], object]] = None
+
+
+HANDLERS: Dict[str, MimeHandler] = {
+    PDF_MIME_TYPE: MimeHandler(
+        source_type='pdf',
+        fetch=lambda drive_client, file_id: drive_client.download_file_stream(file_id),
+        parse=_parse_pdf_buffer,
+        cpu_bound=True,
+        fetch_into=lambda drive_client, file_id, file: drive_client.download_file_stream(file_id, file)
+    ),
+    GOOGLE_DOC_MIME_TYPE: MimeHandler(
+        source_type='google_doc',
+        fetch=lambda drive_client, file_id: drive_client.export_document(file_id, 'text/plain'),
+        parse=parse_google_doc,
+        cpu_bound=False
+    ),
+}
+
+
+def fetch_content(file_meta: Dict) -> Optional[Union[io.BytesIO, str]]:
+    """
+    Download stage: fetch raw content for a file from Drive.
+
+    Args:
+        file_meta: File metadata with 'file_id' and 'mime_type'
+
+    Returns:
+        PDF buffer, exported Google Doc text, or None for unsupported types
+    """
+    handler = HANDLERS.get(file_meta['mime_type'])
+    if handler is None:
+        return None
+
+    return handler.fetch(get_drive_client(), file_meta['file_id'])
+
+
+def spool_content(file_meta: Dict, directory: str) -> Optional[Union[Path, io.BytesIO, str]]:
+    """
+    Download stage for process-pool parsing: like fetch_content, but content
+    of handlers with fetch_into is written to a file in `directory` and its
+    Path returned. A Path pickles to a few bytes, whereas a buffer would be
+    copied in full into the worker process. The parse stage deletes the file.
+
+    Args:
+        file_meta: File metadata with 'file_id' and 'mime_type'
+        directory: Spool directory; the caller removes it when done
+
+    Returns:
+        Spooled file path, fetched content, or None for unsupported types
+    """
+    handler = HANDLERS.get(file_meta['mime_type'])
+    if handler is None or handler.fetch_into is None:
+        return fetch_content(file_meta)
+
+    fd, path = tempfile.mkstemp(dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            handler.fetch_into(get_drive_client(), file_meta['file_id'], file)
+    except BaseException:
+        os.unlink(path)
+        raise
+    return Path(path)
+
+
+def prefetch(
+    files: Iterable[Dict],
+    fetch: Callable[[Dict], Optional[Union[io.BytesIO, str]]] = fetch_content,
+    max_workers: int = DOWNLOAD_WORKERS,
+    depth: int = PREFETCH_DEPTH
+) -> Iterator[Tuple[Dict, Future]]:
+    """
+    Download files in the background, at most `depth` ahead of the consumer.
+
+    Args:
+        files: File metadata dicts to fetch
+        fetch: Download function run on the worker threads
+        max_workers: Download thread pool size
+        depth: Maximum files downloading or waiting to be consumed
+
+    Yields:
+        (file_meta, future) pairs in completion order; future.result()
+        returns the content or raises the download error
+    """
+    files = iter(files)
+    pending: Dict[Future, Dict] = {}
+    pool = ThreadPoolExecutor(max_workers=max_workers)
+
+    def fill():
+        for file_meta in itertools.islice(files, max(depth - len(pending), 0)):
+            pending[pool.submit(fetch, file_meta)] = file_meta
+
+    try:
+        fill()
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            ready = [(pending.pop(future), future) for future in done]
+            # Refill before handing results out so downloads continue
+            # while the consumer parses
+            fill()
+            yield from ready
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def prepare_document(file_meta: Dict, content: Union[io.BytesIO, str, Path]) -> Optional[Dict]:
+    """
+    Parse stage: turn fetched content into a content hash and chunks.
+
+    Runs in worker processes on the CSV path (threads for handlers that
+    are not cpu_bound), so it only relies on its (picklable) arguments
+    and per-process state.
+
+    Args:
+        file_meta: File metadata with 'file_id', 'name' and 'mime_type'
+        content: Output of fetch_content() or spool_content()
+
+    Returns:
+        Dict with 'content_hash' and 'chunks', or None if no text was extracted
+    """
+    handler = HANDLERS[file_meta['mime_type']]
+    text = handler.parse(content)
+
+    # Clean text for PostgreSQL (remove NUL bytes)
+    text = clean_text_for_postgres(text)
+    if not text:
+        return None
+
+    content_hash = DriveClient.compute_content_hash(text)
+
+    chunks = get_chunker().chunk_text(
+        text=text,
+        metadata={
+            'source_type': handler.source_type,
+            'file_id': file_meta['file_id'],
+            'file_name': file_meta['name'],
+            'path': file_meta.get('path', '')
+        }
+    )
+
+    # Clean chunk texts for PostgreSQL
+    for chunk in chunks:
+        chunk['text'] = clean_text_for_postgres(chunk['text'])
+
+    return {
+        'content_hash': content_hash,
+        'chunks': chunks
+    }
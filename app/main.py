@@ -1,9 +1,12 @@
 """FastAPI application with endpoints."""
+import asyncio
+import json
 import logging
 import time
 import uuid
-from typing import Optional
+from typing import Optional, Union
 from fastapi import FastAPI, HTTPException, Depends
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 import psycopg
 from app.config import settings
@@ -27,6 +30,8 @@ app = FastAPI(
 # Convert SQLAlchemy URL to psycopg format
 db_url = settings.db_url.replace('postgresql+psycopg://', 'postgresql://')
 
+NO_RESULTS_ANSWER = "En löytänyt relevanttia tietoa annetusta kysymyksestä."
+
 # Lazy-load services (initialize on first use to avoid startup crashes)
 _retriever = None
 _reranker = None
@@ -145,8 +150,6 @@ async def startup_event():
     _loading = True
     logger.info("🚀 Starting model preload...")
     
-    import asyncio
-    
     async def preload_models():
         try:
             # Load in order of importance
@@ -184,6 +187,7 @@ class JobStatus(BaseModel):
     processed: int
     indexed: int
     errors: list
+    total_errors: int = 0
 
 
 class AskRequest(BaseModel):
@@ -197,7 +201,7 @@ class Source(BaseModel):
     file_name: str
     link: str
     locator: str
-    chunk_id: str
+    chunk_id: Union[uuid.UUID, str]  # Retriever returns native UUIDs; serialized as strings
     snippet: str
 
 
@@ -259,7 +263,7 @@ async def get_ingest_status(job_id: str):
         with psycopg.connect(db_url) as conn:
             with conn.cursor() as cur:
                 cur.execute("""
-                    SELECT state, processed, indexed, errors
+                    SELECT state, processed, indexed, errors, total_errors
                     FROM ingest_jobs
                     WHERE id = %s
                 """, (job_id,))
@@ -273,7 +277,8 @@ async def get_ingest_status(job_id: str):
                     state=result[0],
                     processed=result[1],
                     indexed=result[2],
-                    errors=result[3] or []
+                    errors=result[3] or [],
+                    total_errors=result[4] or 0
                 )
                 
     except HTTPException:
@@ -283,6 +288,82 @@ async def get_ingest_status(job_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+async def retrieve_context(request: AskRequest) -> list:
+    """
+    Expand, retrieve, deduplicate and rerank context chunks for a question.
+    
+    Shared by /ask and /ask-stream.
+    """
+    # Get services
+    llm_service = get_llm_service()
+    retriever = get_retriever()
+    reranker = get_reranker()
+    
+    # Calculate dynamic top_k if not provided
+    if request.top_k is None:
+        top_k = calculate_dynamic_top_k(request.query)
+        logger.info(f"Auto-calculated top_k={top_k} for query: {request.query[:50]}...")
+    else:
+        top_k = request.top_k
+    
+    # Detect if exhaustive search is needed
+    query_lower = request.query.lower()
+    exhaustive_keywords = [
+        'etsi', 'hae', 'löydä', 'kaikki', 'kaikkia',
+        'search', 'find', 'all', 'every', 'each',
+        'listaa', 'luettele', 'kerro kaikki',
+        'mitkä kaikki', 'mitä kaikkea'
+    ]
+    is_exhaustive = any(keyword in query_lower for keyword in exhaustive_keywords)
+    
+    # Increase candidate retrieval for exhaustive searches
+    num_candidates = 100 if is_exhaustive else settings.topk_candidates
+    if is_exhaustive:
+        logger.info(f"Exhaustive search mode: retrieving {num_candidates} candidates")
+    
+    # Handle multi-query expansion
+    if request.multi_query and settings.enable_multi_query:
+        queries = llm_service.generate_multi_queries(request.query)
+        logger.info(f"Generated {len(queries)} query variations")
+    else:
+        queries = [request.query]
+    
+    # Handle HyDE if enabled
+    if request.hyde and settings.enable_hyde:
+        hyde_doc = llm_service.generate_hyde(request.query)
+        queries.append(hyde_doc)
+    
+    # Retrieve candidates from all queries
+    all_candidates = []
+    for query in queries:
+        candidates = retriever.search(query, num_candidates)
+        all_candidates.extend(candidates)
+    
+    # Deduplicate by chunk_id
+    seen = set()
+    unique_candidates = []
+    for cand in all_candidates:
+        if cand['chunk_id'] not in seen:
+            seen.add(cand['chunk_id'])
+            unique_candidates.append(cand)
+    
+    logger.info(f"Retrieved {len(unique_candidates)} unique candidates for reranking")
+    
+    # Rerank candidates off the event loop so concurrent requests can
+    # share a cross-encoder batch
+    if unique_candidates:
+        reranked = await asyncio.to_thread(
+            reranker.rerank,
+            request.query,
+            unique_candidates,
+            top_k
+        )
+    else:
+        reranked = []
+    
+    return reranked
+
+
 @app.post("/ask", response_model=AskResponse)
 async def ask_question(request: AskRequest):
     """
@@ -291,80 +372,17 @@ async def ask_question(request: AskRequest):
     start_time = time.time()
     
     try:
-        # Get services
-        llm_service = get_llm_service()
-        retriever = get_retriever()
-        reranker = get_reranker()
-        
-        # Calculate dynamic top_k if not provided
-        if request.top_k is None:
-            top_k = calculate_dynamic_top_k(request.query)
-            logger.info(f"Auto-calculated top_k={top_k} for query: {request.query[:50]}...")
-        else:
-            top_k = request.top_k
-        
-        # Detect if exhaustive search is needed
-        query_lower = request.query.lower()
-        exhaustive_keywords = [
-            'etsi', 'hae', 'löydä', 'kaikki', 'kaikkia',
-            'search', 'find', 'all', 'every', 'each',
-            'listaa', 'luettele', 'kerro kaikki',
-            'mitkä kaikki', 'mitä kaikkea'
-        ]
-        is_exhaustive = any(keyword in query_lower for keyword in exhaustive_keywords)
-        
-        # Increase candidate retrieval for exhaustive searches
-        num_candidates = 100 if is_exhaustive else settings.topk_candidates
-        if is_exhaustive:
-            logger.info(f"Exhaustive search mode: retrieving {num_candidates} candidates")
-        
-        # Handle multi-query expansion
-        if request.multi_query and settings.enable_multi_query:
-            queries = llm_service.generate_multi_queries(request.query)
-            logger.info(f"Generated {len(queries)} query variations")
-        else:
-            queries = [request.query]
-        
-        # Handle HyDE if enabled
-        if request.hyde and settings.enable_hyde:
-            hyde_doc = llm_service.generate_hyde(request.query)
-            queries.append(hyde_doc)
-        
-        # Retrieve candidates from all queries
-        all_candidates = []
-        for query in queries:
-            candidates = retriever.search(query, num_candidates)
-            all_candidates.extend(candidates)
-        
-        # Deduplicate by chunk_id
-        seen = set()
-        unique_candidates = []
-        for cand in all_candidates:
-            if cand['chunk_id'] not in seen:
-                seen.add(cand['chunk_id'])
-                unique_candidates.append(cand)
-        
-        logger.info(f"Retrieved {len(unique_candidates)} unique candidates for reranking")
-        
-        # Rerank candidates
-        if unique_candidates:
-            reranked = reranker.rerank(
-                request.query,
-                unique_candidates,
-                top_k
-            )
-        else:
-            reranked = []
+        reranked = await retrieve_context(request)
         
         if not reranked:
             return AskResponse(
-                answer="En löytänyt relevanttia tietoa annetusta kysymyksestä.",
+                answer=NO_RESULTS_ANSWER,
                 sources=[],
                 latency_ms=int((time.time() - start_time) * 1000)
             )
         
         # Generate answer with sources
-        result = llm_service.generate_answer(request.query, reranked)
+        result = get_llm_service().generate_answer(request.query, reranked)
         
         latency_ms = int((time.time() - start_time) * 1000)
         
@@ -379,6 +397,49 @@ async def ask_question(request: AskRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _sse(event: str, data) -> str:
+    """Format one Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+
+@app.post("/ask-stream")
+async def ask_question_stream(request: AskRequest):
+    """
+    Like /ask, but streams the answer as Server-Sent Events.
+    
+    Events: one `sources` event (list of sources), `delta` events with
+    answer text fragments as they are generated, and a final `done` event
+    with latency_ms. Errors during generation are sent as an `error` event.
+    """
+    start_time = time.time()
+    
+    try:
+        reranked = await retrieve_context(request)
+    except Exception as e:
+        logger.error(f"Error in ask-stream endpoint: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    def events():
+        if not reranked:
+            yield _sse("sources", [])
+            yield _sse("delta", {"text": NO_RESULTS_ANSWER})
+        else:
+            tokens, sources = get_llm_service().stream_answer(request.query, reranked)
+            yield _sse("sources", sources)
+            try:
+                for text in tokens:
+                    yield _sse("delta", {"text": text})
+            except Exception as e:
+                logger.error(f"Error streaming answer: {e}")
+                yield _sse("error", {"detail": str(e)})
+        
+        yield _sse("done", {"latency_ms": int((time.time() - start_time) * 1000)})
+    
+    # Sync generator: Starlette iterates it in a worker thread, so the
+    # blocking LLM stream doesn't stall the event loop
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
 @app.post("/ask-iterative")
 async def ask_iterative(request: AskRequest):
     """
@@ -513,7 +574,7 @@ Palauta VAIN JSON, ei muuta tekstiä."""
                 continue
             
             # Rerank to get best sources
-            reranked = reranker.rerank(sub_q, candidates, min(5, top_k))
+            reranked = await asyncio.to_thread(reranker.rerank, sub_q, candidates, min(5, top_k))
             
             if not reranked:
                 sub_answers.append({
@@ -727,6 +788,7 @@ async def root():
             "/ingest/start",
             "/ingest/status/{job_id}",
             "/ask",
+            "/ask-stream - /ask as Server-Sent Events",
             "/ask-iterative - Agentic RAG with iterative search",
             "/research - Deep research with sub-questions",
             "/search",
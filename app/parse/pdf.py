@@ -1,60 +1,48 @@
-"""PDF parsing using LangChain PDF loaders."""
+"""PDF parsing using PyMuPDF, with pypdf for metadata."""
 import io
 import logging
-from typing import Optional
-from langchain_community.document_loaders import PyPDFLoader, PDFMinerLoader
-from langchain_core.documents import Document
+import os
+from typing import BinaryIO, Optional, Union
+import fitz
 
 logger = logging.getLogger(__name__)
 
 
-def parse_pdf(content: bytes, filename: str = "temp.pdf") -> str:
+def parse_pdf(content: Union[bytes, BinaryIO, os.PathLike], filename: str = "temp.pdf") -> str:
     """
-    Extract text from PDF content using LangChain loaders.
+    Extract text from PDF content using PyMuPDF.
+    
+    In-memory content is opened directly, no temporary file is written.
     
     Args:
-        content: PDF file content as bytes
+        content: PDF file content as bytes, an in-memory buffer, or the
+            path of a PDF file on disk
         filename: Optional filename for better error messages
         
     Returns:
         Extracted text as string
     """
     try:
-        # Save content to temporary file-like object
-        import tempfile
-        import os
-        
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
-            tmp_file.write(content)
-            tmp_path = tmp_file.name
-        
-        try:
-            # Try PyPDFLoader first (uses pypdf)
-            loader = PyPDFLoader(tmp_path)
-            documents = loader.load()
-            
-            if not documents or not any(doc.page_content.strip() for doc in documents):
-                # If PyPDF returns empty, try PDFMiner
-                logger.info("PyPDF returned empty text, trying PDFMiner fallback")
-                loader = PDFMinerLoader(tmp_path)
-                documents = loader.load()
-            
+        if isinstance(content, os.PathLike):
+            doc = fitz.open(content, filetype="pdf")
+        else:
+            doc = fitz.open(stream=content, filetype="pdf")
+        with doc:
+            pages = (page.get_text("text") for page in doc)
             # Combine all pages
-            full_text = "\n\n".join(doc.page_content for doc in documents if doc.page_content.strip())
-            return full_text
-            
-        finally:
-            # Clean up temp file
-            os.unlink(tmp_path)
+            return "\n\n".join(text for text in pages if text.strip())
         
     except Exception as e:
-        logger.error(f"Error parsing PDF with LangChain: {e}")
+        logger.error(f"Error parsing PDF {filename} with PyMuPDF: {e}")
         raise
 
 
 def extract_pdf_metadata(content: bytes) -> dict:
     """
-    Extract metadata from PDF using LangChain.
+    Extract metadata from PDF using pypdf.
+    
+    Reads only the trailer's /Info dictionary and the page count from
+    /Root /Pages, so page objects are never resolved.
     
     Args:
         content: PDF file content as bytes
@@ -63,27 +51,26 @@ def extract_pdf_metadata(content: bytes) -> dict:
         Dictionary with metadata
     """
     try:
-        import tempfile
-        import os
         from pypdf import PdfReader
         
-        # Still use pypdf directly for metadata extraction
-        pdf_file = io.BytesIO(content)
-        reader = PdfReader(pdf_file)
+        # Opened lazily: only the trailer is read, the page tree is never built
+        trailer = PdfReader(io.BytesIO(content), strict=False).trailer
         
         metadata = {
-            'num_pages': len(reader.pages),
+            'num_pages': int(trailer["/Root"]["/Pages"]["/Count"]),
             'title': '',
             'author': '',
             'subject': '',
             'creator': ''
         }
         
-        if reader.metadata:
-            metadata['title'] = reader.metadata.get('/Title', '')
-            metadata['author'] = reader.metadata.get('/Author', '')
-            metadata['subject'] = reader.metadata.get('/Subject', '')
-            metadata['creator'] = reader.metadata.get('/Creator', '')
+        info = trailer.get('/Info')
+        if info is not None:
+            info = info.get_object()
+            metadata['title'] = info.get('/Title', '')
+            metadata['author'] = info.get('/Author', '')
+            metadata['subject'] = info.get('/Subject', '')
+            metadata['creator'] = info.get('/Creator', '')
         
         return metadata
         
@@ -1,6 +1,10 @@
 """BGE reranking service using sentence-transformers."""
 import logging
-from typing import List, Dict
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import List, Dict, Tuple
 from sentence_transformers import CrossEncoder
 
 logger = logging.getLogger(__name__)
@@ -9,7 +13,12 @@ logger = logging.getLogger(__name__)
 class BGEReranker:
     """Rerank search results using BGE cross-encoder model."""
     
-    def __init__(self, model_name: str = "BAAI/bge-reranker-v2-m3"):
+    def __init__(
+        self,
+        model_name: str = "BAAI/bge-reranker-v2-m3",
+        max_batch: int = 64,
+        max_wait_ms: float = 5.0
+    ):
         """
         Initialize BGE reranker.
         
@@ -18,6 +27,10 @@ class BGEReranker:
                 - BAAI/bge-reranker-v2-m3 (multilingual, recommended)
                 - BAAI/bge-reranker-large
                 - cross-encoder/ms-marco-MiniLM-L-6-v2 (lightweight)
+            max_batch: Maximum number of concurrent rerank calls fused into
+                one forward pass
+            max_wait_ms: How long the batcher waits for more calls to join
+                a batch before running it
         """
         try:
             self.model = CrossEncoder(model_name, max_length=512)
@@ -25,6 +38,57 @@ class BGEReranker:
         except Exception as e:
             logger.error(f"Error loading BGE reranker: {e}")
             raise
+        
+        # Concurrent callers enqueue their pairs and wait on a Future; a single
+        # worker thread fuses whatever is pending into one predict() call.
+        # The torch forward pass releases the GIL, so callers keep running.
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self._pending: "queue.Queue[Tuple[List[List[str]], Future]]" = queue.Queue()
+        self._worker = threading.Thread(
+            target=self._batch_loop,
+            name="bge-rerank-batcher",
+            daemon=True
+        )
+        self._worker.start()
+    
+    def _batch_loop(self):
+        """Collect pending rerank calls and score them in one forward pass."""
+        while True:
+            batch = [self._pending.get()]
+            deadline = time.monotonic() + self.max_wait
+            
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._pending.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            
+            all_pairs = [pair for pairs, _ in batch for pair in pairs]
+            try:
+                scores = self.model.predict(all_pairs, batch_size=64)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            
+            # Scatter scores back to the callers in submission order
+            offset = 0
+            for pairs, future in batch:
+                future.set_result(scores[offset:offset + len(pairs)])
+                offset += len(pairs)
+            
+            if len(batch) > 1:
+                logger.debug(f"Fused {len(batch)} rerank calls ({len(all_pairs)} pairs)")
+    
+    def _predict(self, pairs: List[List[str]]):
+        """Score query-document pairs through the shared micro-batcher."""
+        future: Future = Future()
+        self._pending.put((pairs, future))
+        return future.result()
     
     def rerank(
         self,
@@ -51,7 +115,7 @@ class BGEReranker:
             pairs = [[query, doc['text']] for doc in documents]
             
             # Get reranking scores
-            scores = self.model.predict(pairs)
+            scores = self._predict(pairs)
             
             # Sort documents by score
             scored_docs = []
@@ -79,14 +79,10 @@ class HybridRetriever:
                         LIMIT %s
                     """, (query_embedding, query_embedding, top_k))
                     
-                    results = []
-                    for row in cur.fetchall():
-                        results.append({
-                            'chunk_id': str(row[0]),
-                            'vector_score': float(row[1])
-                        })
-                    
-                    return results
+                    return [
+                        {'chunk_id': chunk_id, 'vector_score': score}
+                        for chunk_id, score in cur.fetchall()
+                    ]
                     
         except Exception as e:
             logger.error(f"Error in vector search: {e}")
@@ -110,41 +106,34 @@ class HybridRetriever:
         try:
             with psycopg.connect(self.db_url) as conn:
                 with conn.cursor() as cur:
+                    # Steer the planner to the GIN index on documents_fts.tsv
+                    # (SET LOCAL only lasts for this transaction)
+                    cur.execute("SET LOCAL enable_seqscan = off")
+                    
                     # Full-text search with ranking
-                    # Use plainto_tsquery with 'simple' dictionary to be language-agnostic
-                    # (avoids relying on english stemmer which can miss non-English texts)
+                    # Use websearch_to_tsquery with 'simple' dictionary to be language-agnostic
+                    # (avoids relying on english stemmer which can miss non-English texts).
+                    # It tokenizes the raw query in C and understands "phrases" and -negation.
                     cur.execute("""
                         SELECT 
                             fts.chunk_id,
                             ts_rank(fts.tsv, query) AS bm25_score
                         FROM documents_fts fts,
-                             plainto_tsquery('simple', %s) query
+                             websearch_to_tsquery('simple', %s) query
                         WHERE fts.tsv @@ query
                         ORDER BY bm25_score DESC
                         LIMIT %s
                     """, (query, top_k))
                     
-                    results = []
-                    for row in cur.fetchall():
-                        results.append({
-                            'chunk_id': str(row[0]),
-                            'bm25_score': float(row[1])
-                        })
-                    
-                    return results
+                    return [
+                        {'chunk_id': chunk_id, 'bm25_score': score}
+                        for chunk_id, score in cur.fetchall()
+                    ]
                     
         except Exception as e:
             logger.error(f"Error in BM25 search: {e}")
             return []
     
-    def _prepare_query_for_tsquery(self, query: str) -> str:
-        """Prepare query string for PostgreSQL tsquery."""
-        # Simple preparation: split words and join with &
-        words = query.lower().split()
-        # Filter out common stop words and join
-        filtered_words = [w for w in words if len(w) > 2]
-        return ' & '.join(filtered_words) if filtered_words else query
-    
     def _reciprocal_rank_fusion(
         self,
         vector_results: List[Dict],
@@ -209,30 +198,31 @@ class HybridRetriever:
             
             with psycopg.connect(self.db_url) as conn:
                 with conn.cursor() as cur:
-                    # Fetch chunks with document metadata
-                    placeholders = ','.join(['%s'] * len(chunk_ids))
-                    cur.execute(f"""
+                    # Fetch chunks with document metadata. Ids stay as the
+                    # UUIDs psycopg returns; the API layer serializes them.
+                    cur.execute("""
                         SELECT 
                             c.id, c.text, c.chunk_index, c.page_or_heading,
                             d.id, d.name, d.path, d.drive_link, d.mime_type
                         FROM chunks c
                         JOIN documents d ON c.document_id = d.id
-                        WHERE c.id::text IN ({placeholders})
-                    """, chunk_ids)
+                        WHERE c.id = ANY(%s)
+                    """, (chunk_ids,))
                     
-                    chunk_details = {}
-                    for row in cur.fetchall():
-                        chunk_details[str(row[0])] = {
-                            'chunk_id': str(row[0]),
+                    chunk_details = {
+                        row[0]: {
+                            'chunk_id': row[0],
                             'text': row[1],
                             'chunk_index': row[2],
                             'page_or_heading': row[3],
-                            'document_id': str(row[4]),
+                            'document_id': row[4],
                             'file_name': row[5],
                             'file_path': row[6],
                             'drive_link': row[7],
                             'mime_type': row[8]
                         }
+                        for row in cur.fetchall()
+                    }
             
             # Merge scores with details
             detailed_results = []
@@ -279,34 +269,50 @@ class HybridRetriever:
 
         # Combine results but do not truncate by top_k; just fuse all candidates
         combined = self._reciprocal_rank_fusion(vector_results, bm25_results, top_k=max_chunks)
+        if not combined:
+            return []
 
-        # Fetch details for chunks
-        chunk_details = self._fetch_chunk_details(combined)
-
-        # Aggregate by document
-        docs = {}
-        for c in chunk_details:
-            doc_id = c.get('document_id')
-            if not doc_id:
-                continue
-            score = c.get('score', 0)
-            if doc_id not in docs:
-                docs[doc_id] = {
-                    'document_id': doc_id,
-                    'file_name': c.get('file_name'),
-                    'drive_link': c.get('drive_link'),
-                    'best_score': score,
-                    'matched_chunks': [c]
-                }
-            else:
-                docs[doc_id]['matched_chunks'].append(c)
-                if score > docs[doc_id]['best_score']:
-                    docs[doc_id]['best_score'] = score
-
-        # Sort documents by best_score desc
-        sorted_docs = sorted(docs.values(), key=lambda x: x['best_score'], reverse=True)
+        # Aggregate by document in SQL, then fetch chunk text only for
+        # the documents that are actually returned
+        try:
+            with psycopg.connect(self.db_url) as conn:
+                with conn.cursor() as cur:
+                    cur.execute("""
+                        SELECT
+                            d.id, d.name, d.drive_link,
+                            MAX(fused.score) AS best_score,
+                            array_agg(c.id ORDER BY fused.score DESC) AS chunk_ids
+                        FROM unnest(%s::uuid[], %s::float8[]) AS fused(chunk_id, score)
+                        JOIN chunks c ON c.id = fused.chunk_id
+                        JOIN documents d ON c.document_id = d.id
+                        GROUP BY d.id
+                        ORDER BY best_score DESC
+                        LIMIT %s
+                    """, (
+                        [r['chunk_id'] for r in combined],
+                        [r['rrf_score'] for r in combined],
+                        top_docs if top_docs and top_docs > 0 else None
+                    ))
+                    doc_rows = cur.fetchall()
+        except Exception as e:
+            logger.error(f"Error aggregating documents: {e}")
+            return []
 
-        if top_docs and top_docs > 0:
-            sorted_docs = sorted_docs[:top_docs]
+        returned_chunk_ids = {chunk_id for row in doc_rows for chunk_id in row[4]}
+        chunk_details = {
+            c['chunk_id']: c
+            for c in self._fetch_chunk_details(
+                [r for r in combined if r['chunk_id'] in returned_chunk_ids]
+            )
+        }
 
-        return sorted_docs
+        return [
+            {
+                'document_id': doc_id,
+                'file_name': file_name,
+                'drive_link': drive_link,
+                'best_score': best_score,
+                'matched_chunks': [chunk_details[cid] for cid in chunk_ids if cid in chunk_details]
+            }
+            for doc_id, file_name, drive_link, best_score, chunk_ids in doc_rows
+        ]
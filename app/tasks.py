@@ -1,16 +1,32 @@
 """Celery tasks for background processing."""
 import logging
+import time
+import orjson
 from celery import Celery
+from celery.signals import worker_process_init
 from app.config import settings
-from app.ingest.drive import DriveClient
-from app.parse.pdf import parse_pdf
-from app.parse.docs import parse_google_doc
-from app.chunking.semantic import SemanticChunker
-from app.index.pgvector import PgVectorIndexer
+from app.ingest.pipeline import (
+    get_drive_client,
+    init_worker,
+    prefetch,
+    prepare_document,
+)
+from app.index.pgvector import ChunkBuffer, FlushResult, PgVectorIndexer
 import psycopg
+from psycopg.types.json import Jsonb, set_json_dumps
 
 logger = logging.getLogger(__name__)
 
+# Minimum seconds between Celery progress updates
+PROGRESS_INTERVAL = 1.0
+
+# Most recent errors kept on the job row and task result; the full count
+# goes to ingest_jobs.total_errors
+MAX_STORED_ERRORS = 200
+
+# settings.db_url is a SQLAlchemy URL; psycopg needs the plain form
+db_url = settings.db_url.replace('postgresql+psycopg://', 'postgresql://')
+
 # Initialize Celery
 celery_app = Celery(
     'drive_rag',
@@ -27,6 +43,29 @@ celery_app.conf.update(
 )
 
 
+# Load the tokenizer once per worker process rather than in the first task
+worker_process_init.connect(lambda **kwargs: init_worker(), weak=False)
+
+
+def _record_flush(result: FlushResult, errors: list) -> int:
+    """
+    Log the documents a chunk flush wrote and add an error entry for each
+    one it could not write.
+    
+    Returns:
+        Number of chunks written
+    """
+    for file_meta, chunk_count in result.written:
+        logger.info(f"Indexed {file_meta['name']}: {chunk_count} chunks")
+    for file_meta, error in result.failed:
+        logger.error(f"Error indexing file {file_meta.get('name', 'unknown')}: {error}")
+        errors.append({
+            'file_id': file_meta.get('file_id', 'unknown'),
+            'error': str(error)
+        })
+    return sum(chunk_count for _, chunk_count in result.written)
+
+
 @celery_app.task(bind=True)
 def ingest_folder_task(self, job_id: str, root_folder_id: str, full_reindex: bool = False):
     """
@@ -37,117 +76,132 @@ def ingest_folder_task(self, job_id: str, root_folder_id: str, full_reindex: boo
         root_folder_id: Google Drive folder ID
         full_reindex: Whether to reindex existing documents
     """
+    # One connection for all job status updates of this task
+    conn = psycopg.connect(db_url, autocommit=True)
+    set_json_dumps(orjson.dumps, conn)
+    
     try:
         # Update job status to running
-        with psycopg.connect(settings.db_url) as conn:
-            with conn.cursor() as cur:
-                cur.execute(
-                    "UPDATE ingest_jobs SET state = 'running' WHERE id = %s",
-                    (job_id,)
-                )
-                conn.commit()
-        
-        # Initialize services
-        drive_client = DriveClient(settings.google_application_credentials)
-        chunker = SemanticChunker(
-            max_tokens=settings.max_chunk_tokens,
-            overlap_tokens=settings.chunk_overlap
+        conn.execute(
+            "UPDATE ingest_jobs SET state = 'running' WHERE id = %s",
+            (job_id,),
+            prepare=True
         )
-        indexer = PgVectorIndexer(settings.db_url)
         
-        # List all files
-        logger.info(f"Listing files from folder {root_folder_id}")
-        files = drive_client.list_files_recursive(root_folder_id)
-        
-        processed = 0
-        indexed = 0
-        errors = []
-        
-        for file_meta in files:
+        # Initialize services
+        drive_client = get_drive_client()
+        indexer = PgVectorIndexer(db_url)
+        # Close the pool however the job ends
+        try:
+            chunk_buffer = ChunkBuffer(indexer)
+            
+            # List all files
+            logger.info(f"Listing files from folder {root_folder_id}")
+            files = drive_client.list_files_recursive(root_folder_id)
+            
+            processed = 0
+            indexed = 0
+            skipped = 0
+            errors = []
+            last_progress = 0.0
+            
+            # One lookup for all listed files instead of a query per file
+            existing_hashes = {} if full_reindex else indexer.get_content_hashes(
+                [file_meta['file_id'] for file_meta in files]
+            )
+            
+            # Download in the background while this thread parses and indexes.
+            # Celery prefork workers are daemonic and cannot spawn a process
+            # pool, so only the network-bound stage is parallelized here.
             try:
-                # Update progress
-                self.update_state(
-                    state='PROGRESS',
-                    meta={'processed': processed, 'total': len(files)}
-                )
-                
-                # Parse document based on type
-                if file_meta['mime_type'] == 'application/pdf':
-                    content_bytes = drive_client.download_file(file_meta['file_id'])
-                    text = parse_pdf(content_bytes)
-                elif file_meta['mime_type'] == 'application/vnd.google-apps.document':
-                    text = drive_client.export_document(file_meta['file_id'])
-                    text = parse_google_doc(text)
-                else:
-                    logger.warning(f"Unsupported mime type: {file_meta['mime_type']}")
-                    continue
-                
-                if not text or not text.strip():
-                    logger.warning(f"Empty text for file {file_meta['name']}")
-                    errors.append({
-                        'file_id': file_meta['file_id'],
-                        'error': 'Empty text after parsing'
-                    })
-                    processed += 1
-                    continue
-                
-                # Compute content hash
-                content_hash = drive_client.compute_content_hash(text)
-                file_meta['content_sha256'] = content_hash
-                
-                # Chunk text
-                chunks = chunker.chunk_text(text, metadata={
-                    'file_id': file_meta['file_id'],
-                    'file_name': file_meta['name']
-                })
-                
-                # Index document and chunks
-                doc_id = indexer.upsert_document(file_meta)
-                chunk_count = indexer.index_chunks(doc_id, chunks)
-                
-                processed += 1
-                indexed += chunk_count
-                
-                logger.info(f"Indexed {file_meta['name']}: {chunk_count} chunks")
-                
-            except Exception as e:
-                logger.error(f"Error processing file {file_meta.get('name', 'unknown')}: {e}")
-                errors.append({
-                    'file_id': file_meta.get('file_id', 'unknown'),
-                    'error': str(e)
-                })
-                processed += 1
-                continue
+                for file_meta, future in prefetch(files):
+                    try:
+                        # Update progress, throttled to spare a backend round trip per file
+                        now = time.monotonic()
+                        if now - last_progress >= PROGRESS_INTERVAL:
+                            self.update_state(
+                                state='PROGRESS',
+                                meta={'processed': processed, 'total': len(files)}
+                            )
+                            last_progress = now
+                        
+                        content = future.result()
+                        if content is None:
+                            logger.warning(f"Unsupported mime type: {file_meta['mime_type']}")
+                            continue
+                        
+                        # Parse, hash and chunk document
+                        prepared = prepare_document(file_meta, content)
+                        
+                        if prepared is None:
+                            logger.warning(f"Empty text for file {file_meta['name']}")
+                            errors.append({
+                                'file_id': file_meta['file_id'],
+                                'error': 'Empty text after parsing'
+                            })
+                            processed += 1
+                            continue
+                        
+                        # Unchanged since the last ingest: skip embedding and writes
+                        if existing_hashes.get(file_meta['file_id']) == prepared['content_hash']:
+                            processed += 1
+                            skipped += 1
+                            continue
+                        
+                        file_meta['content_sha256'] = prepared['content_hash']
+                        
+                        # Queue document and chunks; they are written in batches,
+                        # and only count as indexed once their batch is flushed
+                        indexed += _record_flush(
+                            chunk_buffer.add(file_meta, prepared['chunks']),
+                            errors
+                        )
+                        processed += 1
+                        
+                    except Exception as e:
+                        logger.error(f"Error processing file {file_meta.get('name', 'unknown')}: {e}")
+                        errors.append({
+                            'file_id': file_meta.get('file_id', 'unknown'),
+                            'error': str(e)
+                        })
+                        processed += 1
+                        continue
+            finally:
+                # Write the last partial batch of documents
+                indexed += _record_flush(chunk_buffer.flush(), errors)
+        finally:
+            indexer.close()
         
         # Update job status to completed
-        with psycopg.connect(settings.db_url) as conn:
-            with conn.cursor() as cur:
-                cur.execute("""
-                    UPDATE ingest_jobs 
-                    SET state = 'completed', processed = %s, indexed = %s, errors = %s
-                    WHERE id = %s
-                """, (processed, indexed, errors, job_id))
-                conn.commit()
+        stored_errors = errors[-MAX_STORED_ERRORS:]
+        conn.execute("""
+            UPDATE ingest_jobs 
+            SET state = 'completed', processed = %s, indexed = %s,
+                errors = %s, total_errors = %s
+            WHERE id = %s
+        """, (processed, indexed, Jsonb(stored_errors), len(errors), job_id), prepare=True)
         
         return {
             'job_id': job_id,
             'state': 'completed',
             'processed': processed,
             'indexed': indexed,
-            'errors': errors
+            'skipped': skipped,
+            'errors': stored_errors,
+            'total_errors': len(errors)
         }
         
     except Exception as e:
         logger.error(f"Fatal error in ingest task: {e}")
         
         # Update job status to failed
-        with psycopg.connect(settings.db_url) as conn:
-            with conn.cursor() as cur:
-                cur.execute("""
-                    UPDATE ingest_jobs 
-                    SET state = 'failed', errors = %s
-                    WHERE id = %s
-                """, ([{'error': str(e)}], job_id))
-                conn.commit()
+        conn.execute("""
+            UPDATE ingest_jobs 
+            SET state = 'failed', errors = %s, total_errors = 1
+            WHERE id = %s
+        """, (Jsonb([{'error': str(e)}]), job_id), prepare=True)
         
         raise
+    
+    finally:
+        conn.close()
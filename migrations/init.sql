@@ -12,7 +12,7 @@ CREATE TABLE IF NOT EXISTS documents (
     revision TEXT,
     modified_time TIMESTAMPTZ,
     drive_link TEXT NOT NULL,
-    content_sha256 TEXT,
+    content_sha256 TEXT,  -- 'blake3:<hex>'; legacy rows hold bare SHA-256 hex
     created_at TIMESTAMPTZ DEFAULT NOW(),
     updated_at TIMESTAMPTZ DEFAULT NOW()
 );
@@ -83,10 +83,14 @@ CREATE TABLE IF NOT EXISTS ingest_jobs (
     processed INTEGER DEFAULT 0,
     indexed INTEGER DEFAULT 0,
     errors JSONB DEFAULT '[]'::jsonb,
+    total_errors INTEGER DEFAULT 0,
     created_at TIMESTAMPTZ DEFAULT NOW(),
     updated_at TIMESTAMPTZ DEFAULT NOW()
 );
 
+-- Databases created before total_errors existed
+ALTER TABLE ingest_jobs ADD COLUMN IF NOT EXISTS total_errors INTEGER DEFAULT 0;
+
 CREATE INDEX idx_ingest_jobs_state ON ingest_jobs(state);
 CREATE INDEX idx_ingest_jobs_created_at ON ingest_jobs(created_at);
 
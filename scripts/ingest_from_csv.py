@@ -5,14 +5,21 @@ This allows selective ingestion by editing the CSV file.
 """
 
 import csv
+import io
+import itertools
+import os
 import sys
 import time
-import hashlib
+import queue
 import logging
+import shutil
+import tempfile
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, Iterable, Iterator, List, Optional, Union
 from datetime import datetime
-from sqlalchemy import text as sql_text
+from charset_normalizer import from_bytes
 
 # Suppress PDF parser warnings about malformed PDFs
 logging.getLogger('pypdf').setLevel(logging.ERROR)
@@ -28,30 +35,21 @@ from rich.panel import Panel
 from rich import box
 
 from app.config import settings
-from app.database import get_db
-from app.ingest.drive import DriveClient
-from app.parse.pdf import parse_pdf
-from app.parse.docs import parse_google_doc
-from app.chunking.semantic import SemanticChunker
-from app.index.pgvector import EmbeddingService, PgVectorIndexer
+from app.ingest.pipeline import (
+    DOWNLOAD_WORKERS,
+    HANDLERS,
+    PREFETCH_DEPTH,
+    get_chunker,
+    get_drive_client,
+    init_worker,
+    prepare_document,
+    spool_content,
+)
+from app.index.pgvector import ChunkBuffer, FlushResult, PgVectorIndexer
 
 console = Console()
 
 
-def clean_text_for_postgres(text: str) -> str:
-    """Remove NUL bytes and other problematic characters for PostgreSQL."""
-    if not text:
-        return text
-    
-    # Remove NUL bytes
-    text = text.replace('\x00', '')
-    
-    # Remove other control characters except newlines and tabs
-    text = ''.join(char for char in text if char == '\n' or char == '\t' or ord(char) >= 32)
-    
-    return text.strip()
-
-
 class IngestStats:
     def __init__(self):
         self.total = 0
@@ -75,148 +73,132 @@ class IngestStats:
         return self.processed / elapsed if elapsed > 0 else 0
 
 
-def read_csv_files(csv_path: str) -> List[Dict]:
-    """Read file list from CSV with automatic encoding detection."""
-    files = []
+def detect_csv_encoding(csv_path: str) -> str:
+    """Detect the CSV encoding from its first 64 KB."""
+    with open(csv_path, 'rb') as f:
+        sample = f.read(65536)
     
-    # Try different encodings (utf-8-sig handles BOM)
-    encodings = ['utf-8-sig', 'utf-8', 'latin-1', 'cp1252', 'iso-8859-1']
+    best = from_bytes(sample).best()
+    encoding = best.encoding if best else 'utf-8'
+    # utf-8-sig also strips a BOM if present; an ASCII-only sample may
+    # still be followed by UTF-8 further down the file
+    return 'utf-8-sig' if encoding in ('utf_8', 'ascii') else encoding
+
+
+def count_csv_rows(csv_path: str) -> int:
+    """Cheaply count data lines for the progress bar (excludes the header)."""
+    with open(csv_path, 'rb') as f:
+        return max(sum(1 for _ in f) - 1, 0)
+
+
+def read_csv_files(csv_path: str) -> Iterator[Dict]:
+    """Stream file rows from CSV with automatic encoding detection."""
+    encoding = detect_csv_encoding(csv_path)
+    console.print(f"[green]✓ Reading CSV with {encoding} encoding[/green]")
     
-    for encoding in encodings:
-        try:
-            with open(csv_path, 'r', encoding=encoding) as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    # Strip whitespace and BOM from keys and values
-                    cleaned_row = {}
-                    for k, v in row.items():
-                        if k:
-                            # Remove BOM and whitespace from key
-                            clean_key = k.strip().lstrip('\ufeff').strip()
-                            # Strip whitespace from value
-                            clean_value = v.strip() if isinstance(v, str) else v
-                            cleaned_row[clean_key] = clean_value
-                    
-                    # Skip empty rows
-                    if cleaned_row and any(v for v in cleaned_row.values()):
-                        files.append(cleaned_row)
-            console.print(f"[green]✓ CSV read successfully with {encoding} encoding[/green]")
-            return files
-        except (UnicodeDecodeError, UnicodeError):
-            continue
-        except Exception as e:
-            console.print(f"[yellow]Warning: Failed to read with {encoding}: {e}[/yellow]")
-            continue
+    with open(csv_path, 'r', encoding=encoding, errors='replace', newline='') as f:
+        reader = csv.DictReader(f)
+        for row in reader:
+            # Strip whitespace and BOM from keys and values
+            cleaned_row = {}
+            for k, v in row.items():
+                if k:
+                    # Remove BOM and whitespace from key
+                    clean_key = k.strip().lstrip('\ufeff').strip()
+                    # Strip whitespace from value
+                    clean_value = v.strip() if isinstance(v, str) else v
+                    cleaned_row[clean_key] = clean_value
+            
+            # Skip empty rows
+            if cleaned_row and any(v for v in cleaned_row.values()):
+                yield cleaned_row
+
+
+def with_existing_hashes(
+    files: Iterable[Dict],
+    indexer: PgVectorIndexer,
+    batch_size: int = 1000
+) -> Iterator[Dict]:
+    """
+    Attach the stored content hash of already indexed files as 'existing_hash'.
     
-    # If all encodings fail, raise error
-    raise ValueError(f"Could not read CSV file with any supported encoding: {encodings}")
+    Looks hashes up one batch of rows at a time, so the CSV never has to be
+    held in memory.
+    """
+    files = iter(files)
+    while True:
+        batch = list(itertools.islice(files, batch_size))
+        if not batch:
+            return
+        
+        existing_hashes = indexer.get_content_hashes([file_info['file_id'] for file_info in batch])
+        for file_info in batch:
+            if file_info['file_id'] in existing_hashes:
+                file_info['existing_hash'] = existing_hashes[file_info['file_id']]
+            yield file_info
+
+
+def download(file_info: Dict, spool_dir: str) -> Optional[Union[Path, io.BytesIO, str]]:
+    """Download stage: fetch raw content, or None if the file should be skipped."""
+    # Already indexed files are fetched too: only the content hash, compared
+    # in write_document, tells whether they changed
+    content = spool_content(file_info, spool_dir)
+    if content is None:
+        console.print(f"[yellow]Skipping unsupported type: {file_info['mime_type']}[/yellow]")
+    return content
+
+
+def record_flush(result: FlushResult, stats: IngestStats):
+    """Count the documents a chunk flush wrote and record the ones it could not."""
+    for _, chunk_count in result.written:
+        stats.processed += 1
+        stats.chunks_created += chunk_count
+    for file_metadata, error in result.failed:
+        stats.add_error(file_metadata['name'], str(error))
+        console.print(f"[red]Error indexing {file_metadata['name']}: {error}[/red]")
 
 
-def process_file(
+def write_document(
     file_info: Dict,
-    drive_client: DriveClient,
-    chunker: SemanticChunker,
-    indexer: PgVectorIndexer,
+    prepared: Optional[Dict],
+    chunk_buffer: ChunkBuffer,
     stats: IngestStats,
-    full_reindex: bool = False
+    existing_hash: Optional[str] = None
 ) -> bool:
-    """Process a single file from CSV."""
+    """Write stage: queue the document and its chunks for indexing (main thread only)."""
     file_id = file_info['file_id']
     file_name = file_info['name']
-    mime_type = file_info['mime_type']
-    drive_link = file_info['drive_link']
-    path = file_info.get('path', '')
     modified_time = file_info.get('modified_time', '')
 
     try:
-        # Check if already indexed
-        with get_db() as db:
-            if not full_reindex:
-                existing = db.execute(
-                    sql_text("SELECT content_sha256 FROM documents WHERE file_id = :file_id"),
-                    {"file_id": file_id}
-                ).fetchone()
-                
-                if existing:
-                    stats.skipped += 1
-                    return True
-
-        # Parse document based on type
-        if mime_type == 'application/pdf':
-            # Download PDF
-            pdf_bytes = drive_client.download_file(file_id)
-            text = parse_pdf(pdf_bytes)
-            metadata = {"source_type": "pdf"}
-            
-        elif mime_type == 'application/vnd.google-apps.document':
-            # Export Google Doc
-            text = drive_client.export_document(file_id, 'text/plain')
-            metadata = {"source_type": "google_doc"}
-            
-        else:
-            console.print(f"[yellow]Skipping unsupported type: {mime_type}[/yellow]")
+        if prepared is None:
+            console.print(f"[yellow]Empty content: {file_name}[/yellow]")
             stats.skipped += 1
             return True
 
-        if not text or not text.strip():
-            console.print(f"[yellow]Empty content: {file_name}[/yellow]")
+        content_hash = prepared['content_hash']
+        chunks = prepared['chunks']
+
+        # Unchanged since the last ingest: skip embedding and writes
+        if existing_hash == content_hash:
             stats.skipped += 1
             return True
 
-        # Clean text for PostgreSQL (remove NUL bytes)
-        text = clean_text_for_postgres(text)
-
-        # Compute content hash
-        content_hash = hashlib.sha256(text.encode('utf-8')).hexdigest()
-
-        # Check if content changed
-        with get_db() as db:
-            if not full_reindex:
-                existing = db.execute(
-                    sql_text("SELECT content_sha256 FROM documents WHERE file_id = :file_id"),
-                    {"file_id": file_id}
-                ).fetchone()
-                
-                if existing and existing[0] == content_hash:
-                    stats.skipped += 1
-                    return True
-
-        # Chunk text
-        chunks = chunker.chunk_text(
-            text=text,
-            metadata={
-                **metadata,
-                "file_id": file_id,
-                "file_name": file_name,
-                "path": path
-            }
-        )
-
         if not chunks:
             console.print(f"[yellow]No chunks created: {file_name}[/yellow]")
             stats.skipped += 1
             return True
 
-        # Clean chunk texts for PostgreSQL
-        for chunk in chunks:
-            chunk['text'] = clean_text_for_postgres(chunk['text'])
-
-        # Index document
-        doc_id = indexer.upsert_document({
+        # Queue document and chunks; they are written in batches across documents
+        record_flush(chunk_buffer.add({
             'file_id': file_id,
             'name': file_name,
-            'mime_type': mime_type,
+            'mime_type': file_info['mime_type'],
             'content_sha256': content_hash,
-            'drive_link': drive_link,
-            'path': path,
+            'drive_link': file_info['drive_link'],
+            'path': file_info.get('path', ''),
             'modified_time': modified_time if modified_time else None
-        })
-
-        # Index chunks
-        indexer.index_chunks(doc_id, chunks)
-        
-        stats.processed += 1
-        stats.chunks_created += len(chunks)
+        }, chunks), stats)
         return True
 
     except Exception as e:
@@ -225,6 +207,103 @@ def process_file(
         return False
 
 
+def run_pipeline(
+    files: Iterable[Dict],
+    chunk_buffer: ChunkBuffer,
+    stats: IngestStats,
+    progress: Progress,
+    task,
+    download_workers: int = DOWNLOAD_WORKERS,
+    parse_workers: Optional[int] = None,
+    prefetch: int = PREFETCH_DEPTH
+):
+    """
+    Process files through the download -> parse -> write stages.
+
+    Downloads run on a thread pool, parsing and chunking on a process pool
+    (or on the thread pool for light, non-CPU-bound types such as exported
+    Google Docs), and all database writes happen on this thread so psycopg
+    connections are never shared. At most `prefetch` files are downloading or parsing
+    at once, so fetched content cannot pile up faster than it is written.
+    PDFs are downloaded to a temporary spool directory, so parse workers get
+    a file path rather than a pickled copy of each download.
+    """
+    spool_dir = tempfile.mkdtemp(prefix='drive-rag-')
+    download_pool = ThreadPoolExecutor(max_workers=download_workers)
+    # Spawn (not fork) parse workers: forking while download threads hold
+    # locks can deadlock the children
+    parse_pool = ProcessPoolExecutor(
+        max_workers=parse_workers or os.cpu_count(),
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=init_worker
+    )
+
+    # Finished futures from either pool are handed to this thread in order
+    completed: "queue.Queue[Future]" = queue.Queue()
+    stages: Dict[Future, tuple] = {}
+
+    def submit(pool, stage: str, file_info: Dict, fn, *args):
+        future = pool.submit(fn, *args)
+        stages[future] = (stage, file_info)
+        future.add_done_callback(completed.put)
+
+    remaining = iter(files)
+
+    def download_next():
+        file_info = next(remaining, None)
+        if file_info is not None:
+            submit(download_pool, 'download', file_info, download, file_info, spool_dir)
+
+    try:
+        for _ in range(prefetch):
+            download_next()
+
+        while stages:
+            future = completed.get()
+            stage, file_info = stages.pop(future)
+            file_name = file_info['name']
+
+            try:
+                result = future.result()
+            except Exception as e:
+                stats.add_error(file_name, str(e))
+                console.print(f"[red]Error processing {file_name}: {e}[/red]")
+                progress.advance(task)
+                download_next()
+                continue
+
+            if stage == 'download':
+                if result is None:
+                    stats.skipped += 1
+                    progress.advance(task)
+                    download_next()
+                else:
+                    # Only CPU-heavy formats are worth shipping to a process
+                    pool = parse_pool if HANDLERS[file_info['mime_type']].cpu_bound else download_pool
+                    submit(pool, 'parse', file_info, prepare_document, file_info, result)
+                continue
+
+            progress.update(
+                task,
+                description=f"[cyan]Processing: {file_name[:50]}..."
+            )
+            write_document(
+                file_info=file_info,
+                prepared=result,
+                chunk_buffer=chunk_buffer,
+                stats=stats,
+                existing_hash=file_info.get('existing_hash')
+            )
+            progress.advance(task)
+            download_next()
+    finally:
+        download_pool.shutdown(wait=False, cancel_futures=True)
+        parse_pool.shutdown(wait=False, cancel_futures=True)
+        # Also removes spooled files whose parse never ran; downloads still
+        # finishing in the background may race with this, hence ignore_errors
+        shutil.rmtree(spool_dir, ignore_errors=True)
+
+
 def main():
     import argparse
     
@@ -242,6 +321,30 @@ def main():
         action='store_true',
         help='Reprocess all files even if already indexed'
     )
+    parser.add_argument(
+        '--download-workers',
+        type=int,
+        default=DOWNLOAD_WORKERS,
+        help=f'Parallel Drive downloads (default: {DOWNLOAD_WORKERS})'
+    )
+    parser.add_argument(
+        '--parse-workers',
+        type=int,
+        default=None,
+        help='Parallel parse/chunk processes (default: CPU count)'
+    )
+    parser.add_argument(
+        '--prefetch',
+        type=int,
+        default=PREFETCH_DEPTH,
+        help=f'Files downloaded ahead of parsing and writing (default: {PREFETCH_DEPTH})'
+    )
+    parser.add_argument(
+        '--batch-rows',
+        type=int,
+        default=1000,
+        help='Chunks to buffer before each bulk COPY into Postgres (default: 1000)'
+    )
     
     args = parser.parse_args()
 
@@ -254,40 +357,45 @@ def main():
     # Read files from CSV
     console.print(f"\n[cyan]Reading file list from:[/cyan] {args.csv}")
     files = read_csv_files(str(csv_path))
+    first = next(files, None)
     
-    if not files:
+    if first is None:
         console.print("[red]No files found in CSV![/red]")
         sys.exit(1)
 
     # Validate CSV has required columns
     required_columns = ['file_id', 'name', 'mime_type', 'drive_link']
-    if files:
-        missing_columns = [col for col in required_columns if col not in files[0]]
-        if missing_columns:
-            console.print(f"[red]Error: CSV is missing required columns: {', '.join(missing_columns)}[/red]")
-            console.print(f"[yellow]Found columns: {', '.join(files[0].keys())}[/yellow]")
-            console.print(f"\n[cyan]Expected columns: {', '.join(required_columns)}[/cyan]")
-            console.print("\n[yellow]Tip: Generate CSV with:[/yellow]")
-            console.print("  python scripts/list_drive_files.py --folder-id YOUR_ID --format csv > files.csv")
-            sys.exit(1)
-
-    console.print(f"[green]Found {len(files)} files in CSV[/green]\n")
+    missing_columns = [col for col in required_columns if col not in first]
+    if missing_columns:
+        console.print(f"[red]Error: CSV is missing required columns: {', '.join(missing_columns)}[/red]")
+        console.print(f"[yellow]Found columns: {', '.join(first.keys())}[/yellow]")
+        console.print(f"\n[cyan]Expected columns: {', '.join(required_columns)}[/cyan]")
+        console.print("\n[yellow]Tip: Generate CSV with:[/yellow]")
+        console.print("  python scripts/list_drive_files.py --folder-id YOUR_ID --format csv > files.csv")
+        sys.exit(1)
+
+    files = itertools.chain([first], files)
 
     # Initialize components
     stats = IngestStats()
-    stats.total = len(files)
+    stats.total = count_csv_rows(str(csv_path))
+    console.print(f"[green]Found ~{stats.total} files in CSV[/green]\n")
 
     try:
         console.print("[cyan]Initializing components...[/cyan]")
-        drive_client = DriveClient(credentials_path=settings.google_application_credentials)
-        chunker = SemanticChunker(
-            max_tokens=settings.max_chunk_tokens,
-            overlap_tokens=settings.chunk_overlap
-        )
+        # Fail fast on bad credentials before any workers start
+        get_drive_client()
+        # Google Docs are chunked in this process, so load the tokenizer now
+        get_chunker()
         
         # Convert SQLAlchemy URL to psycopg format
         db_url = settings.db_url.replace('postgresql+psycopg://', 'postgresql://')
         indexer = PgVectorIndexer(db_url=db_url)
+        chunk_buffer = ChunkBuffer(indexer, batch_rows=args.batch_rows)
+        
+        # Batched hash lookups instead of a query per file
+        if not args.full_reindex:
+            files = with_existing_hashes(files, indexer)
         
         console.print("[green]✓ Components initialized[/green]\n")
 
@@ -307,24 +415,21 @@ def main():
                 total=stats.total
             )
 
-            # Process each file
-            for file_info in files:
-                file_name = file_info['name']
-                progress.update(
-                    task,
-                    description=f"[cyan]Processing: {file_name[:50]}..."
-                )
-                
-                process_file(
-                    file_info=file_info,
-                    drive_client=drive_client,
-                    chunker=chunker,
-                    indexer=indexer,
+            try:
+                run_pipeline(
+                    files=files,
+                    chunk_buffer=chunk_buffer,
                     stats=stats,
-                    full_reindex=args.full_reindex
+                    progress=progress,
+                    task=task,
+                    download_workers=args.download_workers,
+                    parse_workers=args.parse_workers,
+                    prefetch=args.prefetch
                 )
-                
-                progress.advance(task)
+            finally:
+                # Write the last partial batch, also when interrupted
+                record_flush(chunk_buffer.flush(), stats)
+                indexer.close()
 
         # Display final statistics
         elapsed = time.time() - stats.start_time
@@ -30,6 +30,16 @@ def format_size(size_bytes):
         return "Unknown"
 
 
+def csv_field(value) -> str:
+    """Format a value as a CSV field, quoting it only when needed."""
+    if value is None:
+        return ''
+    value = str(value)
+    if any(c in value for c in ',"\n\r'):
+        return '"' + value.replace('"', '""') + '"'
+    return value
+
+
 def list_drive_files(folder_id: str, output_format: str = "table"):
     """
     List all indexable files from Google Drive folder.
@@ -46,7 +56,7 @@ def list_drive_files(folder_id: str, output_format: str = "table"):
     
     # Initialize Drive client
     try:
-        drive_client = DriveClient(settings.google_application_credentials)
+        drive_client = DriveClient.from_settings(settings)
     except Exception as e:
         console.print(f"[bold red]Error:[/bold red] Failed to initialize Drive client: {e}")
         return
@@ -70,7 +80,6 @@ def list_drive_files(folder_id: str, output_format: str = "table"):
             if output_format == "table":
                 console.print(f"[bold red]Error:[/bold red] Failed to list files: {e}")
             else:
-                import sys
                 sys.stderr.write(f"Error: Failed to list files: {e}\n")
             return
     
@@ -122,24 +131,32 @@ def list_drive_files(folder_id: str, output_format: str = "table"):
         console.print()
         
     elif output_format == "json":
-        import json
-        print(json.dumps(files, indent=2, default=str))
+        import orjson
         
-    elif output_format == "csv":
-        import csv
-        import sys
+        sys.stdout.flush()
+        sys.stdout.buffer.write(orjson.dumps(
+            files,
+            default=str,
+            option=orjson.OPT_INDENT_2 | orjson.OPT_APPEND_NEWLINE
+        ))
+        sys.stdout.buffer.flush()
         
+    elif output_format == "csv":
         # Define fieldnames based on what we want to export
         fieldnames = ['name', 'mime_type', 'path', 'size', 'modified_time', 'file_id', 'drive_link', 'revision']
         
-        writer = csv.DictWriter(
-            sys.stdout,
-            fieldnames=fieldnames,
-            extrasaction='ignore',  # Ignore any extra fields not in fieldnames
-            lineterminator='\n'  # Use only \n to avoid extra blank lines on Windows
+        # Build the whole document and write it in one go; only \n line
+        # endings to avoid extra blank lines on Windows
+        lines = [','.join(fieldnames)]
+        lines.extend(
+            ','.join(csv_field(file.get(field)) for field in fieldnames)
+            for file in files
         )
-        writer.writeheader()
-        writer.writerows(files)
+        lines.append('')
+        
+        sys.stdout.flush()
+        sys.stdout.buffer.write('\n'.join(lines).encode('utf-8'))
+        sys.stdout.buffer.flush()
 
 
 def main():
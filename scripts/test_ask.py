@@ -4,31 +4,93 @@ CLI tool to test the RAG system by asking questions.
 """
 
 import sys
+import time
+import hashlib
 import argparse
-import requests
-import json
+from contextlib import nullcontext
+from functools import lru_cache
+import orjson
 from pathlib import Path
-from rich.console import Console
-from rich.panel import Panel
-from rich.markdown import Markdown
-from rich.table import Table
-from rich import box
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Callable, Dict, Optional
 
-console = Console()
+# rich and requests are imported where they are used, so quick paths
+# such as --health don't pay for the markdown and table machinery
+if TYPE_CHECKING:
+    import requests
+    from rich.console import Console
+    from rich.markdown import Markdown
+    from rich.panel import Panel
+    from rich.table import Table
 
 
-def ask_question(
-    query: str,
-    api_url: str = "http://localhost:8000",
-    multi_query: bool = True,
-    hyde: bool = False,
-    top_k: int = None,  # None = auto-detect
-    timeout: int = 2000
-):
-    """Ask a question to the RAG system."""
-    
-    endpoint = f"{api_url}/ask"
+# Retried on transient gateway errors; every API call is read-only, so
+# POSTs are as safe to retry as GETs
+RETRY_STATUSES = frozenset({502, 503, 504})
+RETRY_METHODS = frozenset({"GET", "POST"})
+
+
+@lru_cache(maxsize=None)
+def _console() -> "Console":
+    from rich.console import Console
+    return Console()
+
+
+@lru_cache(maxsize=None)
+def _stderr_console() -> "Console":
+    from rich.console import Console
+    return Console(stderr=True)
+
+
+def _errors(quiet: bool = False) -> "Console":
+    """Console for error messages: stderr in quiet mode, so --json output stays valid JSON."""
+    return _stderr_console() if quiet else _console()
+
+
+def _status(message: str, quiet: bool = False):
+    """Spinner shown while waiting for the API; nothing in quiet mode."""
+    return nullcontext() if quiet else _console().status(message, spinner="dots")
+
+
+@lru_cache(maxsize=None)
+def _session() -> "requests.Session":
+    """
+    One keep-alive session for every API call, so repeated questions reuse
+    the same connection instead of reconnecting each time.
+    """
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
     
+    session = requests.Session()
+    # Every call goes to one API host. pool_block makes bursts (e.g. --batch
+    # with high --concurrency) wait for a pooled connection instead of
+    # opening throwaway ones. urllib3 already sets TCP_NODELAY on its sockets.
+    adapter = HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=32,
+        pool_block=True,
+        max_retries=Retry(
+            total=3,
+            backoff_factor=0.1,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=RETRY_METHODS
+        )
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+# On-disk answer cache for repeated questions
+CACHE_DIR = Path.home() / ".drive_rag_cache"
+CACHE_TTL = 600  # seconds
+# Share of a cached answer's sources that a fresh /search must still
+# return before the cached answer is served
+CACHE_MIN_OVERLAP = 0.8
+CACHE_PROBE_K = 50
+
+
+def _ask_payload(query: str, multi_query: bool, hyde: bool, top_k) -> dict:
     payload = {
         "query": query,
         "multi_query": multi_query,
@@ -38,86 +100,324 @@ def ask_question(
     # Only add top_k if explicitly set
     if top_k is not None:
         payload["top_k"] = top_k
+    return payload
+
+
+def fetch_answer(
+    query: str,
+    api_url: str = "http://localhost:8000",
+    multi_query: bool = True,
+    hyde: bool = False,
+    top_k: int = None,  # None = auto-detect
+    timeout: int = 2000
+) -> dict:
+    """POST a question to /ask and return the parsed response."""
     
-    console.print(f"\n[cyan]❓ Kysymys:[/cyan] {query}")
-    if top_k is None:
-        console.print(f"[dim]API: {endpoint} (auto top_k)[/dim]\n")
-    else:
-        console.print(f"[dim]API: {endpoint} (top_k={top_k})[/dim]\n")
+    response = _session().post(
+        f"{api_url}/ask",
+        json=_ask_payload(query, multi_query, hyde, top_k),
+        timeout=timeout
+    )
+    response.raise_for_status()
+    return orjson.loads(response.content)
+
+
+def stream_answer(
+    query: str,
+    api_url: str = "http://localhost:8000",
+    multi_query: bool = True,
+    hyde: bool = False,
+    top_k: int = None,
+    timeout: int = 2000
+) -> dict:
+    """
+    POST a question to /ask-stream and render the answer live as it is
+    generated. Returns the assembled response in the same shape as /ask.
+    """
+    from rich.live import Live
+    from rich.markdown import Markdown
     
-    try:
-        with console.status("[bold cyan]Haetaan vastausta...", spinner="dots"):
-            response = requests.post(
-                endpoint,
-                json=payload,
-                timeout=timeout
-            )
-        
+    result = {"answer": "", "sources": [], "latency_ms": 0}
+    parts = []
+    
+    with _session().post(
+        f"{api_url}/ask-stream",
+        json=_ask_payload(query, multi_query, hyde, top_k),
+        timeout=timeout,
+        stream=True
+    ) as response:
         response.raise_for_status()
-        result = response.json()
         
-        # Display answer
-        console.print(Panel(
-            Markdown(result['answer']),
-            title="[bold green]💡 Vastaus[/bold green]",
-            border_style="green",
-            box=box.ROUNDED
-        ))
+        with Live(_answer_panel(Markdown("…")), console=_console(), refresh_per_second=10) as live:
+            event = None
+            for raw_line in response.iter_lines():
+                line = raw_line.decode('utf-8')
+                if line.startswith('event:'):
+                    event = line[len('event:'):].strip()
+                elif line.startswith('data:'):
+                    data = orjson.loads(line[len('data:'):])
+                    if event == 'delta':
+                        parts.append(data['text'])
+                        # Partial answers change every time; don't cache them
+                        live.update(_answer_panel(Markdown(''.join(parts))))
+                    elif event == 'sources':
+                        result['sources'] = data
+                    elif event == 'error':
+                        raise RuntimeError(data['detail'])
+                    elif event == 'done':
+                        result['latency_ms'] = data['latency_ms']
+    
+    result['answer'] = ''.join(parts)
+    render_sources(result)
+    return result
+
+
+def _trunc(text: str, width: int) -> str:
+    """Shorten text to at most `width` characters, marking cuts with an ellipsis."""
+    return text if len(text) <= width else text[:width - 1] + "…"
+
+
+def _sources_table() -> "Table":
+    """Empty table with the columns used for listing sources."""
+    from rich import box
+    from rich.table import Table
+    
+    table = Table(box=box.SIMPLE)
+    table.add_column("#", style="dim", width=3)
+    table.add_column("Tiedosto", style="cyan")
+    table.add_column("Sijainti", style="yellow")
+    table.add_column("Katkelma", style="dim")
+    return table
+
+
+@lru_cache(maxsize=32)
+def _markdown(text: str) -> "Markdown":
+    """Markdown parses on construction; reuse it when an answer is shown again."""
+    from rich.markdown import Markdown
+    return Markdown(text)
+
+
+def _answer_panel(answer: "Markdown") -> "Panel":
+    from rich import box
+    from rich.panel import Panel
+    
+    return Panel(
+        answer,
+        title="[bold green]💡 Vastaus[/bold green]",
+        border_style="green",
+        box=box.ROUNDED
+    )
+
+
+def render_answer(result: dict):
+    """Display an /ask response."""
+    
+    # Display answer
+    _console().print(_answer_panel(_markdown(result['answer'])))
+    render_sources(result)
+
+
+def render_sources(result: dict):
+    """Display the sources and latency of an /ask response."""
+    
+    # Display sources
+    sources = result.get('sources')
+    if sources:
+        _console().print("\n[bold cyan]📚 Lähteet:[/bold cyan]\n")
         
-        # Display sources
-        if result.get('sources'):
-            console.print("\n[bold cyan]📚 Lähteet:[/bold cyan]\n")
-            
-            sources_table = Table(box=box.SIMPLE)
-            sources_table.add_column("#", style="dim", width=3)
-            sources_table.add_column("Tiedosto", style="cyan")
-            sources_table.add_column("Sijainti", style="yellow")
-            sources_table.add_column("Katkelma", style="dim")
-            
-            for i, source in enumerate(result['sources'], 1):
-                sources_table.add_row(
-                    str(i),
-                    source['file_name'][:40],
-                    source.get('locator', 'N/A')[:20],
-                    source.get('snippet', '')[:50] + "..."
-                )
-            
-            console.print(sources_table)
-            
-            # Print clickable links
-            console.print("\n[dim]🔗 Linkit:[/dim]")
-            for i, source in enumerate(result['sources'], 1):
-                console.print(f"  {i}. {source['link']}")
+        sources_table = _sources_table()
+        links = []
+        
+        # Fill the table and collect links in one pass
+        for i, source in enumerate(sources, 1):
+            sources_table.add_row(
+                str(i),
+                _trunc(source['file_name'], 40),
+                _trunc(source.get('locator', 'N/A'), 20),
+                _trunc(source.get('snippet', ''), 50)
+            )
+            links.append(f"  {i}. {source['link']}")
+        
+        _console().print(sources_table)
+        
+        # Print clickable links
+        _console().print("\n[dim]🔗 Linkit:[/dim]")
+        _console().print("\n".join(links))
+    
+    # Display metadata
+    _console().print(f"\n[dim]⏱️  Vasteaika: {result.get('latency_ms', 0):.0f}ms[/dim]")
+
+
+def format_json(data) -> str:
+    """Pretty-print an API response for --json output."""
+    return orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS).decode()
+
+
+def _cache_path(query: str, api_url: str, multi_query: bool, hyde: bool, top_k) -> Path:
+    key = f"{api_url}|{query}|{multi_query}|{hyde}|{top_k}"
+    return CACHE_DIR / f"{hashlib.sha1(key.encode('utf-8')).hexdigest()}.json"
+
+
+def load_cached_answer(cache_path: Path):
+    """Return a cached /ask response younger than CACHE_TTL, or None."""
+    try:
+        entry = orjson.loads(cache_path.read_bytes())
+    except (OSError, ValueError):
+        return None
+    
+    if time.time() - entry.get('stored_at', 0) > CACHE_TTL:
+        return None
+    return entry.get('result')
+
+
+def store_cached_answer(cache_path: Path, result: dict):
+    """Save an /ask response to the cache (best effort)."""
+    try:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        cache_path.write_bytes(orjson.dumps({'stored_at': time.time(), 'result': result}))
+    except OSError:
+        pass
+
+
+def sources_still_retrieved(query: str, sources: list, api_url: str, timeout: int) -> bool:
+    """
+    Evidence gate for cache hits: probe /search and check that most of the
+    cached answer's source chunks are still retrieved for the query.
+    
+    Containment rather than Jaccard is used, since the probe deliberately
+    returns many more chunks than an answer cites.
+    """
+    cached_ids = {str(source.get('chunk_id')) for source in sources}
+    if not cached_ids:
+        return False
+    
+    try:
+        response = _session().post(
+            f"{api_url}/search",
+            json={"query": query, "k": CACHE_PROBE_K},
+            timeout=timeout
+        )
+        response.raise_for_status()
+        probe_ids = {str(hit.get('chunk_id')) for hit in orjson.loads(response.content).get('results', [])}
+    except Exception:
+        return False
+    
+    return len(cached_ids & probe_ids) / len(cached_ids) >= CACHE_MIN_OVERLAP
+
+
+def ask_question(
+    query: str,
+    api_url: str = "http://localhost:8000",
+    multi_query: bool = True,
+    hyde: bool = False,
+    top_k: int = None,  # None = auto-detect
+    timeout: int = 2000,
+    use_cache: bool = True,
+    stream: bool = False,
+    quiet: bool = False
+):
+    """
+    Ask a question to the RAG system.
+    
+    With quiet=True (--json) nothing is rendered; the response is only returned.
+    """
+    import requests
+    
+    endpoint = f"{api_url}/ask"
+    
+    if not quiet:
+        _console().print(f"\n[cyan]❓ Kysymys:[/cyan] {query}")
+        if top_k is None:
+            _console().print(f"[dim]API: {endpoint} (auto top_k)[/dim]\n")
+        else:
+            _console().print(f"[dim]API: {endpoint} (top_k={top_k})[/dim]\n")
+    
+    cache_path = _cache_path(query, api_url, multi_query, hyde, top_k)
+    
+    try:
+        if use_cache:
+            cached = load_cached_answer(cache_path)
+            if cached and sources_still_retrieved(query, cached.get('sources', []), api_url, timeout):
+                if not quiet:
+                    _console().print("[dim]♻️  Vastaus välimuistista (/nocache ohittaa)[/dim]")
+                    render_answer(cached)
+                return cached
         
-        # Display metadata
-        console.print(f"\n[dim]⏱️  Vasteaika: {result.get('latency_ms', 0):.0f}ms[/dim]")
+        if stream and not quiet:
+            # Rendered live while the answer is generated
+            result = stream_answer(query, api_url, multi_query, hyde, top_k, timeout)
+        else:
+            with _status("[bold cyan]Haetaan vastausta...", quiet):
+                result = fetch_answer(query, api_url, multi_query, hyde, top_k, timeout)
+            if not quiet:
+                render_answer(result)
         
+        store_cached_answer(cache_path, result)
         return result
         
     except requests.exceptions.Timeout:
-        console.print("[red]❌ Aikakatkaistu! Yritä pienemmällä top_k arvolla tai pidemmällä timeoutilla.[/red]")
+        _errors(quiet).print("[red]❌ Aikakatkaistu! Yritä pienemmällä top_k arvolla tai pidemmällä timeoutilla.[/red]")
         return None
     except requests.exceptions.ConnectionError:
-        console.print(f"[red]❌ Ei yhteyttä API:in osoitteessa {api_url}[/red]")
-        console.print("[yellow]Varmista että backend on käynnissä: docker-compose up -d[/yellow]")
+        _errors(quiet).print(f"[red]❌ Ei yhteyttä API:in osoitteessa {api_url}[/red]")
+        _errors(quiet).print("[yellow]Varmista että backend on käynnissä: docker-compose up -d[/yellow]")
         return None
     except requests.exceptions.HTTPError as e:
-        console.print(f"[red]❌ HTTP virhe: {e}[/red]")
-        if response.text:
-            console.print(f"[dim]{response.text}[/dim]")
+        _errors(quiet).print(f"[red]❌ HTTP virhe: {e}[/red]")
+        if e.response is not None and e.response.text:
+            _errors(quiet).print(f"[dim]{e.response.text}[/dim]")
         return None
     except Exception as e:
-        console.print(f"[red]❌ Virhe: {e}[/red]")
+        _errors(quiet).print(f"[red]❌ Virhe: {e}[/red]")
         return None
 
 
+def batch_ask(
+    queries: list,
+    api_url: str = "http://localhost:8000",
+    multi_query: bool = True,
+    hyde: bool = False,
+    top_k: int = None,
+    timeout: int = 2000,
+    concurrency: int = 8,
+    quiet: bool = False
+):
+    """Ask many questions concurrently and display the answers in order."""
+    from concurrent.futures import ThreadPoolExecutor
+    
+    if not quiet:
+        _console().print(f"\n[cyan]📋 Erä:[/cyan] {len(queries)} kysymystä (rinnakkain {concurrency})")
+    
+    def fetch(query):
+        try:
+            return fetch_answer(query, api_url, multi_query, hyde, top_k, timeout)
+        except Exception as e:
+            return e
+    
+    with _status("[bold cyan]Haetaan vastauksia...", quiet):
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(fetch, queries))
+    
+    for query, result in zip(queries, results):
+        if isinstance(result, Exception):
+            _errors(quiet).print(f"\n[cyan]❓ Kysymys:[/cyan] {query}")
+            _errors(quiet).print(f"[red]❌ Virhe: {result}[/red]")
+        elif not quiet:
+            _console().print(f"\n[cyan]❓ Kysymys:[/cyan] {query}")
+            render_answer(result)
+    
+    return [None if isinstance(result, Exception) else result for result in results]
+
+
 def search_documents(
     query: str,
     api_url: str = "http://localhost:8000",
     k: int = 20,
-    timeout: int = 30
+    timeout: int = 30,
+    quiet: bool = False
 ):
     """Search documents without answer generation."""
+    from rich.panel import Panel
     
     endpoint = f"{api_url}/search"
     
@@ -126,29 +426,33 @@ def search_documents(
         "k": k
     }
     
-    console.print(f"\n[cyan]🔍 Haku:[/cyan] {query}")
-    console.print(f"[dim]API: {endpoint}[/dim]\n")
+    if not quiet:
+        _console().print(f"\n[cyan]🔍 Haku:[/cyan] {query}")
+        _console().print(f"[dim]API: {endpoint}[/dim]\n")
     
     try:
-        with console.status("[bold cyan]Haetaan dokumentteja...", spinner="dots"):
-            response = requests.post(
+        with _status("[bold cyan]Haetaan dokumentteja...", quiet):
+            response = _session().post(
                 endpoint,
                 json=payload,
                 timeout=timeout
             )
         
         response.raise_for_status()
-        results = response.json()
+        results = orjson.loads(response.content).get('results', [])
+        
+        if quiet:
+            return results
         
         if not results:
-            console.print("[yellow]Ei tuloksia.[/yellow]")
+            _console().print("[yellow]Ei tuloksia.[/yellow]")
             return []
         
-        console.print(f"[green]Löytyi {len(results)} tulosta:[/green]\n")
+        _console().print(f"[green]Löytyi {len(results)} tulosta:[/green]\n")
         
         # Display results
         for i, result in enumerate(results, 1):
-            console.print(Panel(
+            _console().print(Panel(
                 f"[bold]{result['file_name']}[/bold]\n"
                 f"[dim]{result.get('locator', 'N/A')}[/dim]\n\n"
                 f"{result['text'][:200]}...\n\n"
@@ -160,16 +464,20 @@ def search_documents(
         return results
         
     except Exception as e:
-        console.print(f"[red]❌ Virhe: {e}[/red]")
+        _errors(quiet).print(f"[red]❌ Virhe: {e}[/red]")
         return None
 
 
 def iterative_rag(
     query: str,
     api_url: str = "http://localhost:8000",
-    timeout: int = 120  # 2 minutes for iterative process
+    timeout: int = 120,  # 2 minutes for iterative process
+    quiet: bool = False
 ):
     """Perform iterative agentic RAG search."""
+    import requests
+    from rich import box
+    from rich.panel import Panel
     
     endpoint = f"{api_url}/ask-iterative"
     
@@ -178,42 +486,51 @@ def iterative_rag(
         "multi_query": True
     }
     
-    console.print(f"\n[bold cyan]🤖 Iteratiivinen Agentti:[/bold cyan] {query}")
-    console.print(f"[dim]API: {endpoint}[/dim]\n")
+    if not quiet:
+        _console().print(f"\n[bold cyan]🤖 Iteratiivinen Agentti:[/bold cyan] {query}")
+        _console().print(f"[dim]API: {endpoint}[/dim]\n")
     
     try:
-        with console.status("[bold cyan]Agentti tutkii iteratiivisesti (voi kestää 30-120s)...", spinner="dots"):
-            response = requests.post(
+        with _status("[bold cyan]Agentti tutkii iteratiivisesti (voi kestää 30-120s)...", quiet):
+            response = _session().post(
                 endpoint,
                 json=payload,
                 timeout=timeout
             )
         
         response.raise_for_status()
-        result = response.json()
+        result = orjson.loads(response.content)
+        
+        if quiet:
+            return result
         
         # Display iteration history
-        console.print(Panel(
+        _console().print(Panel(
             f"[bold]Iteraatiot: {result['total_iterations']} | "
             f"Lähteet: {result['total_sources']} | "
             f"Luottamus: {result['final_confidence']:.0%}[/bold]",
             border_style="cyan"
         ))
         
+        # One print per iteration; highlight and soft_wrap skip Rich's
+        # auto-highlighting and line measuring for this plain report text
         for iteration in result['iterations']:
             status = "✓" if iteration['confidence'] >= 0.85 else "↻"
-            console.print(f"\n[bold yellow]{status} Kierros {iteration['iteration']}:[/bold yellow]")
-            console.print(f"  Kysymys: {iteration['query']}")
-            console.print(f"  Tulokset: {iteration['num_results']} lähdettä")
-            console.print(f"  Luottamus: {iteration['confidence']:.0%}")
-            console.print(f"  Arvio: {iteration['assessment']}")
+            lines = [
+                f"\n[bold yellow]{status} Kierros {iteration['iteration']}:[/bold yellow]",
+                f"  Kysymys: {iteration['query']}",
+                f"  Tulokset: {iteration['num_results']} lähdettä",
+                f"  Luottamus: {iteration['confidence']:.0%}",
+                f"  Arvio: {iteration['assessment']}",
+            ]
             if iteration['missing_info']:
-                console.print(f"  [dim]Puuttuu: {', '.join(iteration['missing_info'][:3])}[/dim]")
+                lines.append(f"  [dim]Puuttuu: {', '.join(iteration['missing_info'][:3])}[/dim]")
+            _console().print("\n".join(lines), highlight=False, soft_wrap=True)
         
         # Display final answer
-        console.print("\n")
-        console.print(Panel(
-            Markdown(result['answer']),
+        _console().print("\n")
+        _console().print(Panel(
+            _markdown(result['answer']),
             title="[bold green]💡 Kattava Vastaus[/bold green]",
             border_style="green",
             box=box.ROUNDED
@@ -221,48 +538,48 @@ def iterative_rag(
         
         # Display sources
         if result.get('sources'):
-            console.print("\n[bold cyan]📚 Kaikki Lähteet:[/bold cyan]\n")
+            _console().print("\n[bold cyan]📚 Kaikki Lähteet:[/bold cyan]\n")
             
-            sources_table = Table(box=box.SIMPLE)
-            sources_table.add_column("#", style="dim", width=3)
-            sources_table.add_column("Tiedosto", style="cyan")
-            sources_table.add_column("Sijainti", style="yellow")
-            sources_table.add_column("Katkelma", style="dim")
+            sources_table = _sources_table()
             
             for i, source in enumerate(result['sources'][:20], 1):  # Show first 20
                 sources_table.add_row(
                     str(i),
-                    source['file_name'][:40],
-                    source.get('locator', 'N/A')[:20],
-                    source.get('snippet', '')[:50] + "..."
+                    _trunc(source['file_name'], 40),
+                    _trunc(source.get('locator', 'N/A'), 20),
+                    _trunc(source.get('snippet', ''), 50)
                 )
             
-            console.print(sources_table)
+            _console().print(sources_table)
             
             if len(result['sources']) > 20:
-                console.print(f"\n[dim]... ja {len(result['sources']) - 20} muuta lähdettä[/dim]")
+                _console().print(f"\n[dim]... ja {len(result['sources']) - 20} muuta lähdettä[/dim]")
         
-        console.print(f"\n[dim]⏱️  Kokonaisaika: {result.get('latency_ms', 0)/1000:.1f}s[/dim]")
+        _console().print(f"\n[dim]⏱️  Kokonaisaika: {result.get('latency_ms', 0)/1000:.1f}s[/dim]")
         
         return result
         
     except requests.exceptions.Timeout:
-        console.print("[red]❌ Aikakatkaistu! Iteratiivinen prosessi kestää liian kauan.[/red]")
+        _errors(quiet).print("[red]❌ Aikakatkaistu! Iteratiivinen prosessi kestää liian kauan.[/red]")
         return None
     except requests.exceptions.ConnectionError:
-        console.print(f"[red]❌ Ei yhteyttä API:in osoitteessa {api_url}[/red]")
+        _errors(quiet).print(f"[red]❌ Ei yhteyttä API:in osoitteessa {api_url}[/red]")
         return None
     except Exception as e:
-        console.print(f"[red]❌ Virhe: {e}[/red]")
+        _errors(quiet).print(f"[red]❌ Virhe: {e}[/red]")
         return None
 
 
 def deep_research(
     query: str,
     api_url: str = "http://localhost:8000",
-    timeout: int = 3000  # Longer timeout for research
+    timeout: int = 3000,  # Longer timeout for research
+    quiet: bool = False
 ):
     """Perform deep iterative research on a topic."""
+    import requests
+    from rich import box
+    from rich.panel import Panel
     
     endpoint = f"{api_url}/research"
     
@@ -272,82 +589,90 @@ def deep_research(
         # top_k will be auto-calculated if not provided
     }
     
-    console.print(f"\n[bold cyan]🔬 Syvätutkimus:[/bold cyan] {query}")
-    console.print(f"[dim]API: {endpoint}[/dim]\n")
+    if not quiet:
+        _console().print(f"\n[bold cyan]🔬 Syvätutkimus:[/bold cyan] {query}")
+        _console().print(f"[dim]API: {endpoint}[/dim]\n")
     
     try:
-        with console.status("[bold cyan]Tutkitaan dokumentteja iteratiivisesti...", spinner="dots"):
-            response = requests.post(
+        with _status("[bold cyan]Tutkitaan dokumentteja iteratiivisesti...", quiet):
+            response = _session().post(
                 endpoint,
                 json=payload,
                 timeout=timeout
             )
         
         response.raise_for_status()
-        result = response.json()
+        result = orjson.loads(response.content)
+        
+        if quiet:
+            return result
         
         # Display research steps
-        console.print(Panel(
+        _console().print(Panel(
             f"[bold]Tutkimusvaiheet: {result['num_sub_questions']}[/bold]",
             border_style="cyan"
         ))
         
         for i, step in enumerate(result['research_steps'], 1):
-            console.print(f"\n[bold yellow]Vaihe {i}:[/bold yellow] {step['question']}")
             answer_preview = step['answer'][:200]
             if len(step['answer']) > 200:
                 answer_preview += "..."
-            console.print(f"[dim]→ {answer_preview}[/dim]")
+            _console().print(
+                f"\n[bold yellow]Vaihe {i}:[/bold yellow] {step['question']}\n"
+                f"[dim]→ {answer_preview}[/dim]",
+                highlight=False,
+                soft_wrap=True
+            )
         
         # Display final synthesis
-        console.print("\n")
-        console.print(Panel(
-            Markdown(result['answer']),
+        _console().print("\n")
+        _console().print(Panel(
+            _markdown(result['answer']),
             title="[bold green]📊 Synteesivastaus[/bold green]",
             border_style="green",
             box=box.ROUNDED
         ))
         
         # Display sources
-        if result.get('sources'):
-            console.print("\n[bold cyan]📚 Lähteet:[/bold cyan]\n")
+        sources = result.get('sources')
+        if sources:
+            _console().print("\n[bold cyan]📚 Lähteet:[/bold cyan]\n")
             
-            sources_table = Table(box=box.SIMPLE)
-            sources_table.add_column("#", style="dim", width=3)
-            sources_table.add_column("Tiedosto", style="cyan")
-            sources_table.add_column("Sijainti", style="yellow")
-            sources_table.add_column("Katkelma", style="dim")
+            sources_table = _sources_table()
+            links = []
             
-            for i, source in enumerate(result['sources'], 1):
+            # Fill the table and collect links in one pass
+            for i, source in enumerate(sources, 1):
                 sources_table.add_row(
                     str(i),
-                    source['file_name'][:40],
-                    source.get('locator', 'N/A')[:20],
-                    source.get('snippet', '')[:50] + "..."
+                    _trunc(source['file_name'], 40),
+                    _trunc(source.get('locator', 'N/A'), 20),
+                    _trunc(source.get('snippet', ''), 50)
                 )
+                if source.get('link'):
+                    links.append(f"  {i}. {source['link']}")
             
-            console.print(sources_table)
+            _console().print(sources_table)
             
             # Print clickable links
-            console.print("\n[dim]🔗 Linkit:[/dim]")
-            for i, source in enumerate(result['sources'], 1):
-                if source.get('link'):
-                    console.print(f"  {i}. {source['link']}")
+            _console().print("\n[dim]🔗 Linkit:[/dim]")
+            if links:
+                _console().print("\n".join(links))
         
-        console.print(f"\n[dim]⏱️  Tutkimusaika: {result.get('latency_ms', 0)/1000:.1f}s[/dim]")
+        _console().print(f"\n[dim]⏱️  Tutkimusaika: {result.get('latency_ms', 0)/1000:.1f}s[/dim]")
         
         return result
         
     except requests.exceptions.Timeout:
-        console.print("[red]❌ Aikakatkaistu! Tutkimus kestää liian kauan.[/red]")
-        console.print("[yellow]Yritä yksinkertaisempaa kysymystä tai pidennä timeoutia.[/yellow]")
+        _errors(quiet).print("[red]❌ Aikakatkaistu! Tutkimus kestää liian kauan.[/red]")
+        _errors(quiet).print("[yellow]Yritä yksinkertaisempaa kysymystä tai pidennä timeoutia.[/yellow]")
         return None
     except requests.exceptions.ConnectionError:
-        console.print(f"[red]❌ Ei yhteyttä API:in osoitteessa {api_url}[/red]")
-        console.print("[yellow]Varmista että backend on käynnissä: docker-compose up -d[/yellow]")
+        _errors(quiet).print(f"[red]❌ Ei yhteyttä API:in osoitteessa {api_url}[/red]")
+        _errors(quiet).print("[yellow]Varmista että backend on käynnissä: docker-compose up -d[/yellow]")
         return None
     except Exception as e:
-        console.print(f"[red]❌ Virhe: {e}[/red]")
+        _errors(quiet).print(f"[red]❌ Virhe: {e}[/red]")
         return None
 
 
@@ -355,22 +680,104 @@ def check_health(api_url: str = "http://localhost:8000"):
     """Check API health."""
     
     try:
-        response = requests.get(f"{api_url}/healthz", timeout=5)
+        response = _session().get(f"{api_url}/healthz", timeout=5)
         response.raise_for_status()
         
-        console.print(f"[green]✅ API toimii: {api_url}[/green]")
+        _console().print(f"[green]✅ API toimii: {api_url}[/green]")
         return True
         
     except Exception as e:
-        console.print(f"[red]❌ API ei vastaa: {api_url}[/red]")
-        console.print(f"[yellow]Käynnistä backend: docker-compose up -d[/yellow]")
+        _console().print(f"[red]❌ API ei vastaa: {api_url}[/red]")
+        _console().print(f"[yellow]Käynnistä backend: docker-compose up -d[/yellow]")
         return False
 
 
-def interactive_mode(api_url: str = "http://localhost:8000"):
+@dataclass(slots=True)
+class State:
+    """Settings of an interactive session, changed by its /commands."""
+    api_url: str
+    multi_query: bool = True
+    hyde: bool = False
+    top_k: Optional[int] = None  # None = auto-detect
+    use_cache: bool = True
+    stream: bool = False
+    running: bool = True
+
+
+def _cmd_quit(cmd_parts: list, state: State):
+    _console().print("[yellow]Näkemiin! 👋[/yellow]")
+    state.running = False
+
+
+def _cmd_multi(cmd_parts: list, state: State):
+    state.multi_query = not state.multi_query
+    _console().print(f"[green]Multi-query: {state.multi_query}[/green]")
+
+
+def _cmd_hyde(cmd_parts: list, state: State):
+    state.hyde = not state.hyde
+    _console().print(f"[green]HyDE: {state.hyde}[/green]")
+
+
+def _cmd_nocache(cmd_parts: list, state: State):
+    state.use_cache = not state.use_cache
+    _console().print(f"[green]Välimuisti: {state.use_cache}[/green]")
+
+
+def _cmd_stream(cmd_parts: list, state: State):
+    state.stream = not state.stream
+    _console().print(f"[green]Suoratoisto: {state.stream}[/green]")
+
+
+def _cmd_topk(cmd_parts: list, state: State):
+    if len(cmd_parts) > 1:
+        arg = cmd_parts[1].lower()
+        if arg == 'auto':
+            state.top_k = None
+            _console().print(f"[green]Top-K: auto (dynaaminen)[/green]")
+        else:
+            try:
+                state.top_k = int(arg)
+                _console().print(f"[green]Top-K: {state.top_k}[/green]")
+            except ValueError:
+                _console().print("[red]Virheellinen arvo. Käytä numeroa tai 'auto'[/red]")
+    else:
+        _console().print(f"[yellow]Nykyinen top_k: {'auto' if state.top_k is None else state.top_k}[/yellow]")
+
+
+def _with_argument(action: Callable[[str, str], object], usage: str) -> Callable[[list, State], None]:
+    """Handler for a command that runs `action(argument, api_url)`."""
+    def handler(cmd_parts: list, state: State):
+        if len(cmd_parts) > 1:
+            action(cmd_parts[1], state.api_url)
+        else:
+            _console().print(f"[yellow]{usage}[/yellow]")
+    return handler
+
+
+# Interactive /commands; each handler gets the split input line and the session state
+COMMANDS: Dict[str, Callable[[list, State], None]] = {
+    '/quit': _cmd_quit,
+    '/multi': _cmd_multi,
+    '/hyde': _cmd_hyde,
+    '/nocache': _cmd_nocache,
+    '/stream': _cmd_stream,
+    '/topk': _cmd_topk,
+    '/search': _with_argument(search_documents, "Anna hakukysely: /search <kysymys>"),
+    '/iterative': _with_argument(iterative_rag, "Anna kysymys: /iterative <kysymys>"),
+    '/research': _with_argument(deep_research, "Anna tutkimusaihe: /research <aihe>"),
+}
+
+
+def interactive_mode(
+    api_url: str = "http://localhost:8000",
+    use_cache: bool = True,
+    stream: bool = False
+):
     """Interactive question-answer session."""
+    from rich.panel import Panel
     
-    console.print(Panel(
+    _console().print(Panel(
         "[bold cyan]🤖 RAG Testi - Interaktiivinen tila[/bold cyan]\n\n"
         "Kirjoita kysymyksiä ja paina Enter.\n"
         "Komennot:\n"
@@ -380,6 +787,8 @@ def interactive_mode(api_url: str = "http://localhost:8000"):
         "  /multi - Vaihda multi-query päälle/pois\n"
         "  /hyde - Vaihda HyDE päälle/pois\n"
         "  /topk <n> - Aseta top_k arvo (tai 'auto' automaattiseen)\n"
+        "  /nocache - Vaihda vastausvälimuisti pois/päälle\n"
+        "  /stream - Vaihda vastauksen suoratoisto päälle/pois\n"
         "  /quit - Lopeta\n",
         border_style="cyan"
     ))
@@ -388,15 +797,13 @@ def interactive_mode(api_url: str = "http://localhost:8000"):
     if not check_health(api_url):
         return
     
-    multi_query = True
-    hyde = False
-    top_k = None  # None = auto-detect
+    state = State(api_url=api_url, use_cache=use_cache, stream=stream)
     
-    console.print(f"\n[dim]Asetukset: multi_query={multi_query}, hyde={hyde}, top_k={'auto' if top_k is None else top_k}[/dim]\n")
+    _console().print(f"\n[dim]Asetukset: multi_query={state.multi_query}, hyde={state.hyde}, top_k={'auto' if state.top_k is None else state.top_k}[/dim]\n")
     
-    while True:
+    while state.running:
         try:
-            query = console.input("\n[bold cyan]❓ Kysymys:[/bold cyan] ").strip()
+            query = _console().input("\n[bold cyan]❓ Kysymys:[/bold cyan] ").strip()
             
             if not query:
                 continue
@@ -406,73 +813,33 @@ def interactive_mode(api_url: str = "http://localhost:8000"):
                 cmd_parts = query.split(maxsplit=1)
                 cmd = cmd_parts[0].lower()
                 
-                if cmd == '/quit':
-                    console.print("[yellow]Näkemiin! 👋[/yellow]")
-                    break
-                
-                elif cmd == '/multi':
-                    multi_query = not multi_query
-                    console.print(f"[green]Multi-query: {multi_query}[/green]")
-                    continue
-                
-                elif cmd == '/hyde':
-                    hyde = not hyde
-                    console.print(f"[green]HyDE: {hyde}[/green]")
-                    continue
-                
-                elif cmd == '/topk':
-                    if len(cmd_parts) > 1:
-                        arg = cmd_parts[1].lower()
-                        if arg == 'auto':
-                            top_k = None
-                            console.print(f"[green]Top-K: auto (dynaaminen)[/green]")
-                        else:
-                            try:
-                                top_k = int(arg)
-                                console.print(f"[green]Top-K: {top_k}[/green]")
-                            except ValueError:
-                                console.print("[red]Virheellinen arvo. Käytä numeroa tai 'auto'[/red]")
-                    else:
-                        console.print(f"[yellow]Nykyinen top_k: {'auto' if top_k is None else top_k}[/yellow]")
-                    continue
-                
-                elif cmd == '/search':
-                    if len(cmd_parts) > 1:
-                        search_documents(cmd_parts[1], api_url)
-                    else:
-                        console.print("[yellow]Anna hakukysely: /search <kysymys>[/yellow]")
-                    continue
-                
-                elif cmd == '/iterative':
-                    if len(cmd_parts) > 1:
-                        iterative_rag(cmd_parts[1], api_url)
-                    else:
-                        console.print("[yellow]Anna kysymys: /iterative <kysymys>[/yellow]")
-                    continue
-                
-                elif cmd == '/research':
-                    if len(cmd_parts) > 1:
-                        deep_research(cmd_parts[1], api_url)
-                    else:
-                        console.print("[yellow]Anna tutkimusaihe: /research <aihe>[/yellow]")
-                    continue
-                
+                handler = COMMANDS.get(cmd)
+                if handler:
+                    handler(cmd_parts, state)
                 else:
-                    console.print(f"[red]Tuntematon komento: {cmd}[/red]")
-                    continue
+                    _console().print(f"[red]Tuntematon komento: {cmd}[/red]")
+                continue
             
             # Ask question
-            ask_question(query, api_url, multi_query, hyde, top_k)
+            ask_question(
+                query, state.api_url, state.multi_query, state.hyde, state.top_k,
+                use_cache=state.use_cache, stream=state.stream
+            )
             
         except KeyboardInterrupt:
-            console.print("\n[yellow]Näkemiin! 👋[/yellow]")
+            _console().print("\n[yellow]Näkemiin! 👋[/yellow]")
             break
         except EOFError:
-            console.print("\n[yellow]Näkemiin! 👋[/yellow]")
+            _console().print("\n[yellow]Näkemiin! 👋[/yellow]")
             break
 
 
 def main():
+    # Bare health check (common in shell loops): skip building the parser
+    if sys.argv[1:] == ['--health']:
+        check_health()
+        return
+    
     parser = argparse.ArgumentParser(
         description='Test RAG system via CLI',
         formatter_class=argparse.RawDescriptionHelpFormatter,
@@ -493,6 +860,12 @@ Esimerkkejä:
   # Haku ilman vastausta
   python scripts/test_ask.py --search "puheenjohtaja"
 
+  # Kysymyserä tiedostosta (yksi kysymys per rivi, rinnakkain)
+  python scripts/test_ask.py --batch kysymykset.txt --json
+
+  # Näytä vastaus sitä mukaa kun se generoidaan
+  python scripts/test_ask.py -q "projektin aikataulu" --stream
+
   # Käytä HyDE:ä
   python scripts/test_ask.py -q "projektin aikataulu" --hyde
 
@@ -528,6 +901,20 @@ Esimerkkejä:
         help='Hae dokumentteja ilman vastauksen generointia'
     )
     
+    parser.add_argument(
+        '--batch',
+        type=str,
+        metavar='FILE',
+        help='Kysy kaikki tiedoston kysymykset rinnakkain (yksi per rivi)'
+    )
+    
+    parser.add_argument(
+        '--concurrency',
+        type=int,
+        default=8,
+        help='Rinnakkaisten kyselyjen määrä --batch tilassa (oletus: 8)'
+    )
+    
     parser.add_argument(
         '--api-url',
         type=str,
@@ -569,6 +956,19 @@ Esimerkkejä:
         help='HTTP timeout sekunneissa (oletus: 60)'
     )
     
+    parser.add_argument(
+        '--stream',
+        action='store_true',
+        help='Näytä vastaus sitä mukaa kun se generoidaan (/ask-stream)'
+    )
+    
+    parser.add_argument(
+        '--no-cache',
+        action='store_false',
+        dest='use_cache',
+        help='Älä käytä paikallista vastausvälimuistia'
+    )
+    
     parser.add_argument(
         '--health',
         action='store_true',
@@ -578,7 +978,7 @@ Esimerkkejä:
     parser.add_argument(
         '--json',
         action='store_true',
-        help='Tulosta vastaus JSON-muodossa'
+        help='Tulosta vain vastaus JSON-muodossa (ohittaa muotoillun tulosteen)'
     )
     
     args = parser.parse_args()
@@ -593,11 +993,12 @@ Esimerkkejä:
         result = iterative_rag(
             args.iterative,
             api_url=args.api_url,
-            timeout=args.timeout * 2  # Double timeout for iterative
+            timeout=args.timeout * 2,  # Double timeout for iterative
+            quiet=args.json
         )
         
         if args.json and result:
-            print(json.dumps(result, indent=2, ensure_ascii=False))
+            print(format_json(result))
         return
     
     # Deep research mode
@@ -605,11 +1006,12 @@ Esimerkkejä:
         result = deep_research(
             args.research,
             api_url=args.api_url,
-            timeout=args.timeout
+            timeout=args.timeout,
+            quiet=args.json
         )
         
         if args.json and result:
-            print(json.dumps(result, indent=2, ensure_ascii=False))
+            print(format_json(result))
         return
     
     # Search mode
@@ -618,11 +1020,34 @@ Esimerkkejä:
             args.search,
             api_url=args.api_url,
             k=args.top_k,
-            timeout=args.timeout
+            timeout=args.timeout,
+            quiet=args.json
         )
         
         if args.json and results:
-            print(json.dumps(results, indent=2, ensure_ascii=False))
+            print(format_json(results))
+        return
+    
+    # Batch mode
+    if args.batch:
+        queries = [
+            line.strip()
+            for line in Path(args.batch).read_text(encoding='utf-8').splitlines()
+            if line.strip()
+        ]
+        results = batch_ask(
+            queries,
+            api_url=args.api_url,
+            multi_query=args.multi_query,
+            hyde=args.hyde,
+            top_k=args.top_k,
+            timeout=args.timeout,
+            concurrency=args.concurrency,
+            quiet=args.json
+        )
+        
+        if args.json:
+            print(format_json(results))
         return
     
     # Single question mode
@@ -633,15 +1058,18 @@ Esimerkkejä:
             multi_query=args.multi_query,
             hyde=args.hyde,
             top_k=args.top_k,
-            timeout=args.timeout
+            timeout=args.timeout,
+            use_cache=args.use_cache,
+            stream=args.stream,
+            quiet=args.json
         )
         
         if args.json and result:
-            print(json.dumps(result, indent=2, ensure_ascii=False))
+            print(format_json(result))
         return
     
     # Interactive mode (default)
-    interactive_mode(args.api_url)
+    interactive_mode(args.api_url, use_cache=args.use_cache, stream=args.stream)
 
 
 if __name__ == "__main__":
@@ -4,136 +4,267 @@ Usage:
     python scripts/verify_drive_setup.py
 """
 import sys
-import os
 from pathlib import Path
 
 # Add parent directory to path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from app.config import settings
-from rich.console import Console
-from rich.panel import Panel
-from rich.table import Table
 import json
+from concurrent.futures import Future, ThreadPoolExecutor
+
+try:
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    json_loads = json.loads
+
+# Keys every service account JSON file must contain
+_REQUIRED_SA_FIELDS = frozenset((
+    'type', 'project_id', 'private_key_id',
+    'private_key', 'client_email', 'client_id'
+))
+
+
+def _status_line(console, symbol: str, style: str, message: str):
+    """
+    Print an indented check result. Built as a Text, so the message is
+    neither parsed as markup nor mangled by brackets in paths and errors.
+    """
+    from rich.text import Text
+    console.print(Text(f"   {symbol} {message}", style=style))
+
+
+def _ok(console, message: str):
+    _status_line(console, "✓", "green", message)
+
+
+def _err(console, message: str):
+    _status_line(console, "✗", "red", message)
+
+
+def _warn(console, message: str):
+    _status_line(console, "⚠", "yellow", message)
+
+
+def _hint(console, message: str):
+    _status_line(console, "→", "yellow", message)
+
+
+def _details_table():
+    """Two-column table for the service account details."""
+    from rich.table import Table
+    
+    table = Table(show_header=False, box=None)
+    table.add_column("Field", style="cyan")
+    table.add_column("Value", style="white")
+    return table
+
+
+def _probe_drive(sa_path, sa_data, root_folder_id):
+    """
+    Build a Drive client and, if a folder is configured, look up the folder
+    and the authenticated account.
+    
+    Returns:
+        Dict of request id ('folder', 'about') to (response, exception);
+        empty when no folder ID is set
+    
+    Raises:
+        Whatever DriveClient raises when it cannot be initialized
+    """
+    from app.ingest.drive import DriveClient
+    
+    # Reuse the JSON parsed in check 2 instead of reading the file again
+    drive_client = DriveClient(sa_path, info=sa_data)
+    
+    results = {}
+    if not root_folder_id:
+        return results
+    
+    def collect(request_id, response, exception):
+        results[request_id] = (response, exception)
+    
+    # The folder lookup and the identity check go out as one batched HTTP
+    # request instead of a round trip each
+    service = drive_client.service
+    batch = service.new_batch_http_request(callback=collect)
+    batch.add(
+        service.files().get(
+            fileId=root_folder_id,
+            fields='name, id, mimeType'
+        ),
+        request_id='folder'
+    )
+    batch.add(service.about().get(fields='user/emailAddress'), request_id='about')
+    try:
+        batch.execute()
+    except Exception as e:
+        results['folder'] = (None, e)
+        results['about'] = (None, e)
+    return results
+
+
+def _start_probe(sa_path, sa_data, root_folder_id) -> Future:
+    """Run _probe_drive on a background thread."""
+    pool = ThreadPoolExecutor(max_workers=1)
+    future = pool.submit(_probe_drive, sa_path, sa_data, root_folder_id)
+    # The submitted probe still runs to completion
+    pool.shutdown(wait=False)
+    return future
 
 
 def verify_setup():
     """Verify Google Drive service account configuration."""
-    console = Console()
+    # Imported here so a bare import of this module stays cheap
+    from rich.console import Console
     
-    console.print("\n[bold cyan]Google Drive Setup Verification[/bold cyan]\n")
+    console = Console()
     
-    issues = []
-    warnings = []
+    if sys.stdout.isatty():
+        _run_checks(console)
+        return
     
-    # Check 1: Service account file exists
+    # Piped output (CI logs): render the whole report, then write it at once
+    with console.capture() as capture:
+        _run_checks(console)
+    sys.stdout.write(capture.get())
+
+
+def _check_sa_source(console, sa_path, sa_json, issues):
+    """Check 1: return the raw service account JSON, or None if unreadable."""
     console.print("[cyan]1. Checking service account file...[/cyan]")
-    sa_path = settings.google_application_credentials
     
-    if not os.path.exists(sa_path):
+    if sa_json:
+        # Inline credentials take precedence; there is no file to read
+        _ok(console, "Using inline GOOGLE_APPLICATION_CREDENTIALS_JSON")
+        return sa_json.encode('utf-8')
+    
+    # One read serves both the existence check and JSON parsing
+    try:
+        raw = Path(sa_path).read_bytes()
+    except FileNotFoundError:
         issues.append(f"Service account file not found: {sa_path}")
-        console.print(f"   [red]✗ File not found: {sa_path}[/red]")
-    else:
-        console.print(f"   [green]✓ File exists: {sa_path}[/green]")
-        
-        # Check 2: Valid JSON
-        console.print("[cyan]2. Validating JSON format...[/cyan]")
-        try:
-            with open(sa_path, 'r') as f:
-                sa_data = json.load(f)
-            console.print("   [green]✓ Valid JSON format[/green]")
-            
-            # Check 3: Required fields
-            console.print("[cyan]3. Checking required fields...[/cyan]")
-            required_fields = [
-                'type', 'project_id', 'private_key_id', 
-                'private_key', 'client_email', 'client_id'
-            ]
-            
-            missing_fields = [f for f in required_fields if f not in sa_data]
-            if missing_fields:
-                issues.append(f"Missing fields in SA file: {', '.join(missing_fields)}")
-                console.print(f"   [red]✗ Missing fields: {', '.join(missing_fields)}[/red]")
-            else:
-                console.print("   [green]✓ All required fields present[/green]")
-                
-                # Display service account info
-                table = Table(show_header=False, box=None)
-                table.add_column("Field", style="cyan")
-                table.add_column("Value", style="white")
-                
-                table.add_row("Type", sa_data.get('type', 'N/A'))
-                table.add_row("Project ID", sa_data.get('project_id', 'N/A'))
-                table.add_row("Client Email", sa_data.get('client_email', 'N/A'))
-                table.add_row("Client ID", sa_data.get('client_id', 'N/A'))
-                
-                console.print("\n   [bold]Service Account Details:[/bold]")
-                console.print(table)
-                
-                # Important reminder
-                console.print("\n   [yellow]⚠ Important:[/yellow] Share your Drive folder with this email:")
-                console.print(f"   [bold green]{sa_data.get('client_email')}[/bold green]")
-                
-        except json.JSONDecodeError as e:
-            issues.append(f"Invalid JSON in service account file: {e}")
-            console.print(f"   [red]✗ Invalid JSON: {e}[/red]")
-        except Exception as e:
-            issues.append(f"Error reading service account file: {e}")
-            console.print(f"   [red]✗ Error: {e}[/red]")
-    
-    # Check 4: .env configuration
+        _err(console, f"File not found: {sa_path}")
+        return None
+    except OSError as e:
+        issues.append(f"Error reading service account file: {e}")
+        _err(console, f"Error: {e}")
+        return None
+    
+    _ok(console, f"File exists: {sa_path}")
+    return raw
+
+
+def _check_sa_json(console, raw, issues):
+    """Check 2: return the parsed service account JSON, or None if invalid."""
+    console.print("[cyan]2. Validating JSON format...[/cyan]")
+    try:
+        sa_data = json_loads(raw)
+    except ValueError as e:
+        # JSONDecodeError, or undecodable bytes
+        issues.append(f"Invalid JSON in service account file: {e}")
+        _err(console, f"Invalid JSON: {e}")
+        return None
+    
+    if not isinstance(sa_data, dict):
+        issues.append("Service account file is not a JSON object")
+        _err(console, "Not a JSON object")
+        return None
+    
+    _ok(console, "Valid JSON format")
+    return sa_data
+
+
+def _check_sa_fields(console, sa_data, issues) -> bool:
+    """Check 3: required fields; shows the account details when they are present."""
+    console.print("[cyan]3. Checking required fields...[/cyan]")
+    missing_fields = sorted(_REQUIRED_SA_FIELDS - sa_data.keys())
+    if missing_fields:
+        issues.append(f"Missing fields in SA file: {', '.join(missing_fields)}")
+        _err(console, f"Missing fields: {', '.join(missing_fields)}")
+        return False
+    
+    _ok(console, "All required fields present")
+    
+    # Display service account info
+    table = _details_table()
+    table.add_row("Type", sa_data.get('type', 'N/A'))
+    table.add_row("Project ID", sa_data.get('project_id', 'N/A'))
+    table.add_row("Client Email", sa_data.get('client_email', 'N/A'))
+    table.add_row("Client ID", sa_data.get('client_id', 'N/A'))
+    
+    console.print("\n   [bold]Service Account Details:[/bold]")
+    console.print(table)
+    
+    # Important reminder
+    console.print("\n   [yellow]⚠ Important:[/yellow] Share your Drive folder with this email:")
+    console.print(f"   [bold green]{sa_data.get('client_email')}[/bold green]")
+    return True
+
+
+def _check_env(console, root_folder_id, warnings):
+    """Check 4: .env configuration."""
     console.print("\n[cyan]4. Checking .env configuration...[/cyan]")
     
-    if not settings.root_folder_id:
+    if not root_folder_id:
         warnings.append("ROOT_FOLDER_ID not set in .env")
-        console.print("   [yellow]⚠ ROOT_FOLDER_ID not set[/yellow]")
+        _warn(console, "ROOT_FOLDER_ID not set")
     else:
-        console.print(f"   [green]✓ ROOT_FOLDER_ID: {settings.root_folder_id}[/green]")
+        _ok(console, f"ROOT_FOLDER_ID: {root_folder_id}")
+
+
+def _check_drive(console, probe: Future, root_folder_id, issues):
+    """Checks 5 and 6: Drive client and folder access, from the background probe."""
+    console.print("\n[cyan]5. Testing Drive API connection...[/cyan]")
+    try:
+        from googleapiclient.errors import HttpError
+        results = probe.result()
+    except Exception as e:
+        issues.append(f"Failed to initialize Drive client: {e}")
+        _err(console, f"Failed to initialize: {e}")
+        return
     
-    if settings.embedding_backend == "vertex" and not settings.gcp_project_id:
-        warnings.append("GCP_PROJECT_ID not set (needed for Vertex AI)")
-        console.print("   [yellow]⚠ GCP_PROJECT_ID not set (needed for Vertex AI)[/yellow]")
-    elif settings.gcp_project_id:
-        console.print(f"   [green]✓ GCP_PROJECT_ID: {settings.gcp_project_id}[/green]")
+    _ok(console, "Drive client initialized successfully")
     
-    # Check 5: Try to initialize Drive client
-    console.print("\n[cyan]5. Testing Drive API connection...[/cyan]")
+    # Try to list files if folder ID is set
+    if not root_folder_id:
+        return
+    
+    console.print(f"\n[cyan]6. Testing access to folder {root_folder_id}...[/cyan]")
     try:
-        from app.ingest.drive import DriveClient
-        drive_client = DriveClient(sa_path)
-        console.print("   [green]✓ Drive client initialized successfully[/green]")
+        about_info, about_error = results['about']
+        if about_error is None:
+            console.print(f"   [dim]Authenticated as: {about_info['user']['emailAddress']}[/dim]")
+        
+        folder_info, folder_error = results['folder']
+        if folder_error is not None:
+            raise folder_error
         
-        # Try to list files if folder ID is set
-        if settings.root_folder_id:
-            console.print(f"\n[cyan]6. Testing access to folder {settings.root_folder_id}...[/cyan]")
-            try:
-                # Try to get folder info
-                folder_info = drive_client.service.files().get(
-                    fileId=settings.root_folder_id,
-                    fields='name, id, mimeType'
-                ).execute()
-                
-                console.print(f"   [green]✓ Successfully accessed folder: {folder_info.get('name')}[/green]")
-                console.print(f"   [dim]Folder ID: {folder_info.get('id')}[/dim]")
-                
-            except Exception as e:
-                if "404" in str(e):
-                    issues.append("Folder not found or not shared with service account")
-                    console.print(f"   [red]✗ Folder not found or not accessible[/red]")
-                    console.print(f"   [yellow]→ Make sure the folder is shared with the service account email[/yellow]")
-                elif "403" in str(e):
-                    issues.append("Permission denied - folder not shared")
-                    console.print(f"   [red]✗ Permission denied[/red]")
-                    console.print(f"   [yellow]→ Share the folder with the service account as Viewer[/yellow]")
-                else:
-                    issues.append(f"Error accessing folder: {e}")
-                    console.print(f"   [red]✗ Error: {e}[/red]")
+        _ok(console, f"Successfully accessed folder: {folder_info.get('name')}")
+        console.print(f"   [dim]Folder ID: {folder_info.get('id')}[/dim]")
         
+    except HttpError as e:
+        status = e.resp.status
+        if status == 404:
+            issues.append("Folder not found or not shared with service account")
+            _err(console, "Folder not found or not accessible")
+            _hint(console, "Make sure the folder is shared with the service account email")
+        elif status == 403:
+            issues.append("Permission denied - folder not shared")
+            _err(console, "Permission denied")
+            _hint(console, "Share the folder with the service account as Viewer")
+        else:
+            issues.append(f"Error accessing folder: {e}")
+            _err(console, f"Error: {e}")
     except Exception as e:
-        issues.append(f"Failed to initialize Drive client: {e}")
-        console.print(f"   [red]✗ Failed to initialize: {e}[/red]")
+        issues.append(f"Error accessing folder: {e}")
+        _err(console, f"Error: {e}")
+
+
+def _summarize(console, issues, warnings):
+    """Print the final verdict panel."""
+    from rich.panel import Panel
     
-    # Summary
     console.print("\n" + "="*70)
     
     if not issues and not warnings:
@@ -162,5 +293,45 @@ def verify_setup():
         console.print("\n[cyan]Setup is mostly correct, but consider addressing warnings.[/cyan]\n")
 
 
+def _run_checks(console):
+    """
+    Run the checks in order and print the report to `console`.
+    
+    Stops at the first fatal problem with the credentials: without a
+    readable, valid key the Drive checks cannot pass, so they are skipped.
+    """
+    from app.config import get_settings
+    
+    # Snapshot the settings used below so every check sees the same values
+    settings = get_settings()
+    sa_path = settings.google_application_credentials
+    sa_json = settings.google_application_credentials_json
+    root_folder_id = settings.root_folder_id
+    
+    console.print("\n[bold cyan]Google Drive Setup Verification[/bold cyan]\n")
+    
+    issues = []
+    warnings = []
+    
+    raw = _check_sa_source(console, sa_path, sa_json, issues)
+    if raw is None:
+        return _summarize(console, issues, warnings)
+    
+    sa_data = _check_sa_json(console, raw, issues)
+    if sa_data is None:
+        return _summarize(console, issues, warnings)
+    
+    if not _check_sa_fields(console, sa_data, issues):
+        return _summarize(console, issues, warnings)
+    
+    # The key is complete, so the Drive round trip can start; let it run
+    # while the .env check is printed
+    probe = _start_probe(sa_path, sa_data, root_folder_id)
+    
+    _check_env(console, root_folder_id, warnings)
+    _check_drive(console, probe, root_folder_id, issues)
+    _summarize(console, issues, warnings)
+
+
 if __name__ == "__main__":
     verify_setup()